@@ -1,103 +1,472 @@
+import argparse
+import asyncio
+import logging
 import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from Cassette import Cassette, CassetteAdapter, CassetteMiss
+from HotelCache import HotelCache
+from HotelIndex import HotelIndex
+from HotelRecords import HotelList, Rating
+from RateLimiter import RETRY_STATUSES, CircuitBreaker, RetryPolicy, TokenBucket, getRateLimiter
+from Tracing import tracer
+
 load_dotenv()
 
 API_KEY = os.getenv("AMADEUS_API_KEY")
 API_SECRET = os.getenv("AMADEUS_API_SECRET")
 
-if not API_KEY or not API_SECRET:
+logger = logging.getLogger(__name__)
+
+# optional record/replay of all API traffic (see Cassette.py), e.g. AMADEUS_CASSETTE=tokyo.jsonl.gz
+CASSETTE_PATH = os.getenv("AMADEUS_CASSETTE")
+CASSETTE_MODE = os.getenv("AMADEUS_CASSETTE_MODE", "replay")
+CASSETTE_LATENCY = os.getenv("AMADEUS_CASSETTE_LATENCY", "0")  # seconds, or "recorded"
+
+# replaying a cassette needs no credentials
+if (not API_KEY or not API_SECRET) and not (CASSETTE_PATH and CASSETTE_MODE == "replay"):
     raise ValueError("Please set AMADEUS_API_KEY and AMADEUS_API_SECRET in your .env file")
 
+BASE_URL = os.getenv("AMADEUS_BASE_URL", "https://test.api.amadeus.com")
+TOKEN_PATH = "/v1/security/oauth2/token"
+HOTELS_BY_GEOCODE_PATH = "/v1/reference-data/locations/hotels/by-geocode"
+HOTEL_SENTIMENTS_PATH = "/v2/e-reputation/hotel-sentiments"
+
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry at which we fetch a new token
+
+# optional on-disk tier for the hotel search cache, e.g. AMADEUS_CACHE_PATH=hotel_cache.sqlite
+CACHE_PATH = os.getenv("AMADEUS_CACHE_PATH")
+
+RATING_BATCH_SIZE = 3  # max hotelIds per hotel-sentiments request
+RATING_COALESCE_WINDOW = 0.005  # seconds single getRating calls wait for company
+
+
+class RatingCoalescer:
+    """
+    Merges single-ID rating lookups that arrive within `window` seconds into one request.
+    fetch takes a list of hotel IDs and returns a dict keyed by hotel ID.
+    """
+
+    def __init__(self, fetch, window: float = RATING_COALESCE_WINDOW, max_batch: int = RATING_BATCH_SIZE):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}  # hotel ID -> Future
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def get(self, hotel_ID: str):
+        batch = None
+        with self._lock:
+            future = self._pending.get(hotel_ID)
+            if future is None:
+                future = Future()
+                self._pending[hotel_ID] = future
+                if len(self._pending) >= self.max_batch:
+                    batch = self._take()
+                elif self._timer is None:
+                    self._timer = threading.Timer(self.window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            self._run(batch)
+        return future.result()
+
+    def _take(self) -> dict:
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch: dict):
+        error = None
+        try:
+            results = self.fetch(list(batch))
+            for hotel_ID, future in batch.items():
+                future.set_result(results.get(hotel_ID))
+        except Exception as e:
+            error = e
+        except BaseException as e:
+            # e.g. KeyboardInterrupt in whichever thread ran the batch: it goes on up that thread,
+            # and the other callers get an error instead of waiting forever
+            error = RuntimeError(f"rating lookup interrupted by {type(e).__name__}")
+            raise
+        finally:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error or RuntimeError("rating lookup ended without a result"))
+
+
+class AmadeusClient:
+    """
+    Shared client for the Amadeus API.
+    Keeps one OAuth token until it is close to expiring and a pooled keep-alive session,
+    so repeated tool calls don't pay for a token request and a new TLS handshake every time.
+    With a Cassette the session records every exchange to it, or replays them from it offline.
+    Requests are paced by the process-wide rate limiter and retried on 429s and 5xx; while the
+    API keeps failing, searches are answered from expired cache entries (see RateLimiter).
+    """
+
+    def __init__(self, api_key: str = API_KEY, api_secret: str = API_SECRET, base_url: str = BASE_URL, pool_size: int = 10,
+                 cache: HotelCache = None, index: HotelIndex = None, cassette: Cassette = None, cassette_latency=0.0,
+                 rate_limiter: TokenBucket = None, retry: RetryPolicy = None, breaker: CircuitBreaker = None):
+        """
+        cassette_latency: seconds added to every replayed response, or "recorded" for the original timing
+        rate_limiter: bucket shared with other clients (default: getRateLimiter())
+        """
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache if cache is not None else HotelCache(path=CACHE_PATH)
+        self.index = index if index is not None else HotelIndex()
+        self.cassette = cassette
+        self.rate_limiter = rate_limiter if rate_limiter is not None else getRateLimiter()
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.retries = 0
+        self.stale_served = 0
+
+        self.session = requests.Session()
+        if cassette is not None:
+            adapter = CassetteAdapter(cassette, latency=cassette_latency, pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+
+        self._rating_pool = ThreadPoolExecutor(max_workers=pool_size)
+        self._rating_coalescer = RatingCoalescer(self._fetchRatings)
+
+    def getToken(self) -> str:
+        """
+        Returns a valid access token, requesting a new one only when the cached one is about to expire.
+        Concurrent callers wait on the lock so the token is refreshed exactly once.
+        """
+        if self._token and time.monotonic() < self._token_expiry:
+            return self._token
+        with self._token_lock:
+            # another thread may have refreshed it while we were waiting
+            if self._token and time.monotonic() < self._token_expiry:
+                return self._token
+            auth_data = {
+                "grant_type": "client_credentials",
+                "client_id": self.api_key,
+                "client_secret": self.api_secret
+            }
+            auth_response = self._request("POST", TOKEN_PATH, data=auth_data)
+            auth_response.raise_for_status()
+            body = auth_response.json()
+            expires_in = int(body.get("expires_in", 1799))
+            self._token = body["access_token"]
+            self._token_expiry = time.monotonic() + max(0, expires_in - TOKEN_REFRESH_MARGIN)
+            return self._token
+
+    def invalidateToken(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expiry = 0.0
+
+    @property
+    def replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.mode == "replay"
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        One API request, sent once the rate limiter lets it through (replays aren't paced) and
+        the breaker allows it. 429s, 5xx and dropped connections are retried as the retry policy
+        says. Returns the last response for the caller to check, or raises the last network
+        error. Raises CircuitOpen without calling the API while the breaker is open.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before()
+            try:
+                if not self.replaying:
+                    self.rate_limiter.acquire()
+                with tracer.span(f"{method} {path}", "http", attempt=attempt) as span:
+                    response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+                    span.set(status=response.status_code, bytes=len(response.content))
+            except CassetteMiss:
+                self.breaker.release()
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.failure()
+                delay = self.retry.delay(attempt)
+                if delay is None:
+                    raise
+                reason = type(e).__name__
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.success()
+                    return response
+                # a 429 means the API is up but we are over the quota, so it doesn't trip the breaker
+                if response.status_code == 429:
+                    self.breaker.success()
+                else:
+                    self.breaker.failure()
+                delay = self.retry.delay(attempt, response)
+                if delay is None:
+                    return response
+                reason = str(response.status_code)
+            self.retries += 1
+            tracer.count("amadeus_retries_total", reason=reason)
+            logger.warning("%s %s failed (%s), retry %d in %.2fs", method, path, reason, attempt + 1, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _get(self, path: str, params: dict = None) -> dict:
+        """GET an API path with the cached token, retrying once with a fresh token on a 401."""
+        token_refreshed = False
+        while True:
+            # the token comes first: a refresh is a request of its own, through the same breaker
+            headers = {"Authorization": f"Bearer {self.getToken()}"}
+            response = self._request("GET", path, headers=headers, params=params)
+            if response.status_code == 401 and not token_refreshed:
+                token_refreshed = True
+                self.invalidateToken()
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def hotelsByGeocode(self, latitude: float, longitude: float, radius: float) -> HotelList:
+        """
+        Returns the hotels around the given location, served from the cache when an earlier
+        query snapped to the same grid cell with the same radius, or from the spatial index
+        when an earlier, wider search already covered the circle.
+        """
+        hotels = self.cache.get(latitude, longitude, radius)
+        if hotels is not None:
+            tracer.count("hotel_lookups_total", source="cache")
+            return hotels
+        hotels = self.index.query(latitude, longitude, radius)
+        if hotels is not None:
+            tracer.count("hotel_lookups_total", source="index")
+            return hotels
+        tracer.count("hotel_lookups_total", source="api")
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius": radius,
+            "radiusUnit": "KM",
+            "hotelSource": "ALL"
+        }
+        try:
+            response = self._get(HOTELS_BY_GEOCODE_PATH, params)
+        except CassetteMiss:
+            raise
+        except requests.RequestException as e:
+            unavailable = not isinstance(e, requests.HTTPError) or e.response is None or e.response.status_code in RETRY_STATUSES
+            stale = self.cache.getStale(latitude, longitude, radius) if unavailable else None
+            if stale is None:
+                raise
+            # an out-of-date answer beats none while the API is down or over quota
+            logger.warning("serving stale hotels for (%s, %s): %s", latitude, longitude, e)
+            self.stale_served += 1
+            tracer.count("hotel_lookups_total", source="stale")
+            return stale
+        logger.debug("by-geocode response: %s", response)
+        hotels = HotelList.fromJson(response)
+        self.index.add(latitude, longitude, radius, hotels)
+        self.cache.put(latitude, longitude, radius, hotels)
+        return hotels
 
-def searchHotels(latitude: float, longitude: float, radius: float):
+    def searchHotels(self, latitude: float, longitude: float, radius: float) -> HotelList:
+        """
+        Searches for hotels near the given latitude and longitude within the specified radius (km).
+        Returns a HotelList; str() of it lists the hotels with addresses.
+        """
+        return self.hotelsByGeocode(latitude, longitude, radius)
+
+    def getRating(self, hotel_ID: str) -> Rating: #doesn't work with the above - contacted amadeus dev's to ask why it's not compatible
+        """
+        Retrieves the rating and sentiment details for a specific hotel by its ID.
+        str() of the result gives the readable summary.
+        """
+        return self._rating_coalescer.get(hotel_ID)
+
+    def _fetchRatings(self, hotel_IDs: list) -> dict:
+        """
+        One hotel-sentiments request for up to RATING_BATCH_SIZE IDs, returning {hotel ID: Rating}.
+        If the API rejects the batch, the IDs are retried one at a time so a single bad ID
+        doesn't hide the ratings of the others.
+        """
+        try:
+            hotel_data = self._get(HOTEL_SENTIMENTS_PATH, {"hotelIds": ",".join(hotel_IDs)})
+        except CassetteMiss:
+            raise
+        except (requests.ConnectionError, requests.Timeout):
+            # the API is down, or the breaker is open: results without ratings rather than a failed turn
+            return {hotel_ID: Rating.missing(hotel_ID) for hotel_ID in hotel_IDs}
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in RETRY_STATUSES:
+                return {hotel_ID: Rating.missing(hotel_ID) for hotel_ID in hotel_IDs}
+            if e.response is None or e.response.status_code != 400:
+                raise
+            if len(hotel_IDs) == 1:
+                return {hotel_IDs[0]: Rating.missing(hotel_IDs[0])}
+            results = {}
+            for hotel_ID in hotel_IDs:
+                results.update(self._fetchRatings([hotel_ID]))
+            return results
+        logger.debug("hotel-sentiments response: %s", hotel_data)
+        results = {hotel_ID: Rating.missing(hotel_ID) for hotel_ID in hotel_IDs}
+        for hotel in hotel_data.get("data", []):
+            if hotel.get("hotelId") in results:
+                results[hotel["hotelId"]] = Rating.fromJson(hotel)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "rate_limiter": self.rate_limiter.stats(),
+            "breaker": self.breaker.stats(),
+            "retries": self.retries,
+            "stale_served": self.stale_served,
+        }
+
+    def getRatings(self, hotel_IDs: list) -> dict:
+        """
+        Ratings for many hotels at once, sent in parallel batches of RATING_BATCH_SIZE IDs.
+        Returns a dict of Rating records keyed by hotel ID; hotels without rating data get
+        an explicit Rating.missing entry (rating.available is False).
+        """
+        hotel_IDs = list(dict.fromkeys(hotel_IDs))
+        batches = [hotel_IDs[i:i + RATING_BATCH_SIZE] for i in range(0, len(hotel_IDs), RATING_BATCH_SIZE)]
+        results = {}
+        for batch_result in self._rating_pool.map(self._fetchRatings, batches):
+            results.update(batch_result)
+        return results
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def getClient() -> AmadeusClient:
+    """Returns the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE) if CASSETTE_PATH else None
+                _client = AmadeusClient(cassette=cassette, cassette_latency=_latency(CASSETTE_LATENCY))
+    return _client
+
+
+def _latency(value: str):
+    return value if value == "recorded" else float(value)
+
+
+class AsyncAmadeusClient:
+    """
+    asyncio front end for AmadeusClient.
+    Requests run on worker threads through the wrapped client, so the token cache and the
+    connection pool are shared with the synchronous functions. At most max_concurrency
+    requests are in flight at once per event loop.
+    """
+
+    def __init__(self, client: AmadeusClient = None, max_concurrency: int = 5):
+        self.client = client or getClient()
+        self.max_concurrency = max_concurrency
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> semaphore
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _run(self, func, *args):
+        async with self._semaphore():
+            return await asyncio.to_thread(func, *args)
+
+    async def search_hotels(self, latitude: float, longitude: float, radius: float):
+        """Async version of AmadeusClient.searchHotels."""
+        return await self._run(self.client.searchHotels, latitude, longitude, radius)
+
+    async def get_rating(self, hotel_ID: str):
+        """Async version of AmadeusClient.getRating."""
+        return await self._run(self.client.getRating, hotel_ID)
+
+    async def get_ratings(self, hotel_IDs: list) -> dict:
+        """Async version of AmadeusClient.getRatings."""
+        return await self._run(self.client.getRatings, hotel_IDs)
+
+    async def search_many(self, coords_list: list, radius: float, return_exceptions: bool = False) -> list:
+        """
+        Searches around every (latitude, longitude) pair in coords_list at the same time.
+        Results come back in the same order as coords_list.
+        """
+        return await asyncio.gather(
+            *(self.search_hotels(latitude, longitude, radius) for latitude, longitude in coords_list),
+            return_exceptions=return_exceptions,
+        )
+
+
+_async_client = None
+
+
+def getAsyncClient() -> AsyncAmadeusClient:
+    """Returns the process-wide async client, sharing the token and session of getClient()."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncAmadeusClient(getClient())
+    return _async_client
+
+
+def searchHotels(latitude: float, longitude: float, radius: float) -> HotelList:
     """
     Searches for hotels near the given latitude and longitude within the specified radius (km).
-    Returns a string listing hotels with addresses.
+    Returns a HotelList; str() of it lists the hotels with addresses.
     """
-    # Get access token
-    auth_url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    auth_data = {
-        "grant_type": "client_credentials",
-        "client_id": API_KEY,
-        "client_secret": API_SECRET
-    }
-
-    auth_response = requests.post(auth_url, data=auth_data)
-    auth_response.raise_for_status()
-    access_token = auth_response.json()["access_token"]
-
-    # Search hotels by geocode
-    search_url = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-geocode"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "radius": radius,
-        "radiusUnit": "KM",
-        "hotelSource": "ALL"
-    }
-
-    response = requests.get(search_url, headers=headers, params=params)
-    response.raise_for_status()
-    hotels = response.json()
-
-    # Build result string
-    res = ""
-    print(hotels)
-    for hotel in hotels.get("data", []):
-        hotelID = hotel.get("hotelId", "Unknown")
-        name = hotel.get("name", "Unknown")
-        address_lines = hotel.get("address", {}).get("lines", [])
-        city = hotel.get("address", {}).get("cityName", "")
-        country = hotel.get("address", {}).get("countryCode", "")
-        res += f"ID:{hotelID} - {name} - {', '.join(address_lines)} - {city}, {country}\n"
-
-    return res
-def getRating(hotel_ID: str): #doesn't work with the above - contacted amadeus dev's to ask why it's not compatible
+    return getClient().searchHotels(latitude, longitude, radius)
+def getRating(hotel_ID: str) -> Rating:
     """
     Retrieves the rating and sentiment details for a specific hotel by its ID.
     """
-    auth_url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    auth_data = {
-        "grant_type": "client_credentials",
-        "client_id": API_KEY,
-        "client_secret": API_SECRET
-    }
-
-    auth_response = requests.post(auth_url, data=auth_data)
-    auth_response.raise_for_status()
-    access_token = auth_response.json()["access_token"]
-
-    search_url = f"https://test.api.amadeus.com/v2/e-reputation/hotel-sentiments?hotelIds={hotel_ID}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-
-    response = requests.get(search_url, headers=headers)
-    response.raise_for_status()
-    hotel_data = response.json()
-    print(hotel_data)
-    if not hotel_data.get("data"):
-        return f"No rating information found for hotel ID: {hotel_ID}"
-    
-    hotel = hotel_data["data"][0]
-    hotelID = hotel.get("hotelId", "Unknown")
-    overallRating = hotel.get("overallRating", "Unknown")
-    numberOfReviews = hotel.get("numberOfReviews", "Unknown")
-    numberOfRatings = hotel.get("numberOfRatings", "Unknown")
-    sentiments = hotel.get("sentiments", {})
-
-    #Build result string
-    res = f"Hotel ID: {hotelID}\n"
-    res += f"Overall Rating: {overallRating}/100\n"
-    res += f"Number of Reviews: {numberOfReviews}\n"
-    res += f"Number of Ratings: {numberOfRatings}\n"
-    res += "\nSentiment Scores:\n"
-    for key, value in sentiments.items():
-        res += f"  - {key}: {value}/100\n"
-    return res
+    return getClient().getRating(hotel_ID)
+def getRatings(hotel_IDs: list) -> dict:
+    """
+    Retrieves ratings for many hotels at once, as Rating records keyed by hotel ID.
+    """
+    return getClient().getRatings(hotel_IDs)
 def main():
+    parser = argparse.ArgumentParser(description="Sample hotel search and rating lookup")
+    parser.add_argument("--cassette", default=CASSETTE_PATH, help="cassette file to record to or replay from")
+    parser.add_argument("--mode", choices=["record", "replay"], default=CASSETTE_MODE)
+    parser.add_argument("--latency", default=CASSETTE_LATENCY, help='seconds added to replayed responses, or "recorded"')
+    args = parser.parse_args()
+    global _client
+    if args.cassette:
+        _client = AmadeusClient(cassette=Cassette(args.cassette, args.mode), cassette_latency=_latency(args.latency))
     print(searchHotels(35.6938, 139.7034, 1))
     print(getRating("TELONMFS"))
+    if args.cassette:
+        _client.cassette.close()
+        print(_client.cassette.stats())
 if __name__ == "__main__":
     main()
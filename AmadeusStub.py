@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Amadeus endpoints used by AmadeusCall.
+Serves the OAuth token, hotels/by-geocode and hotel-sentiments endpoints from a
+deterministic fake world so the clients can be exercised without credentials or quota.
+It can also act like a busy API: over --rate-limit requests per second get a 429 with
+Retry-After, and a share --error-rate of the API calls fail with a 503.
+
+    python AmadeusStub.py --port 8080 --latency 0.05
+    AMADEUS_BASE_URL=http://127.0.0.1:8080 ...
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CELL_SIZE = 0.005  # degrees, roughly 500m - every cell holds 0-3 fake hotels
+MAX_SENTIMENT_IDS = 3
+
+
+def _hash(*parts) -> int:
+    return int(hashlib.md5(":".join(str(p) for p in parts).encode()).hexdigest(), 16)
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in km."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def hotelsInCell(i: int, j: int) -> list:
+    """The fake hotels living in grid cell (i, j). Always the same for the same cell."""
+    h = _hash("cell", i, j)
+    hotels = []
+    for n in range(h % 4):
+        hh = _hash("hotel", i, j, n)
+        lat = (i + (hh % 1000) / 1000) * CELL_SIZE
+        lon = (j + (hh // 1000 % 1000) / 1000) * CELL_SIZE
+        hotel_id = f"ST{hh % 0xFFFFFF:06X}"
+        hotels.append({
+            "chainCode": "ST",
+            "iataCode": "STB",
+            "name": f"STUB HOTEL {hotel_id[2:]}",
+            "hotelId": hotel_id,
+            "geoCode": {"latitude": round(lat, 5), "longitude": round(lon, 5)},
+            "address": {"lines": [f"{hh % 97 + 1}-{hh % 13 + 1} Stub Street"], "cityName": "STUBVILLE", "countryCode": "ZZ"},
+        })
+    return hotels
+
+
+def hotelsByGeocode(latitude: float, longitude: float, radius: float) -> list:
+    lat_span = radius / 111.0
+    lon_span = radius / (111.0 * max(math.cos(math.radians(latitude)), 0.01))
+    res = []
+    for i in range(math.floor((latitude - lat_span) / CELL_SIZE), math.floor((latitude + lat_span) / CELL_SIZE) + 1):
+        for j in range(math.floor((longitude - lon_span) / CELL_SIZE), math.floor((longitude + lon_span) / CELL_SIZE) + 1):
+            for hotel in hotelsInCell(i, j):
+                distance = haversine(latitude, longitude, hotel["geoCode"]["latitude"], hotel["geoCode"]["longitude"])
+                if distance <= radius:
+                    res.append(dict(hotel, distance={"value": round(distance, 2), "unit": "KM"}))
+    res.sort(key=lambda hotel: hotel["distance"]["value"])
+    return res
+
+
+def hotelSentiment(hotel_ID: str):
+    """Fake rating for a hotel, or None for roughly a quarter of the IDs."""
+    h = _hash("rating", hotel_ID)
+    if h % 4 == 0:
+        return None
+    keys = ["sleepQuality", "service", "facilities", "roomComforts", "valueForMoney", "location", "staff"]
+    return {
+        "type": "hotelSentiment",
+        "hotelId": hotel_ID,
+        "overallRating": 50 + h % 50,
+        "numberOfReviews": h % 2000,
+        "numberOfRatings": h % 3000,
+        "sentiments": {key: 40 + _hash(hotel_ID, key) % 60 for key in keys},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization", "").startswith("Bearer stub-token"):
+            return True
+        self._send(401, {"errors": [{"status": 401, "code": 38192, "title": "Invalid access token"}]})
+        return False
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.server.record(url.path)
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if url.path.endswith("/security/oauth2/token"):
+            self._send(200, {"type": "amadeusOAuth2Token", "access_token": "stub-token", "expires_in": 1799, "state": "approved"})
+        else:
+            self._send(404, {"errors": [{"status": 404, "title": "Not Found"}]})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.record(url.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if not self._authorized():
+            return
+        if self.server.throttled():
+            self._send(429, {"errors": [{"status": 429, "code": 38194, "title": "Too many requests"}]}, {"Retry-After": "1"})
+            return
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send(503, {"errors": [{"status": 503, "title": "Service Unavailable"}]})
+            return
+        if url.path.endswith("/locations/hotels/by-geocode"):
+            data = hotelsByGeocode(float(query["latitude"]), float(query["longitude"]), float(query.get("radius", 5)))
+            self._send(200, {"data": data, "meta": {"count": len(data)}})
+        elif url.path.endswith("/e-reputation/hotel-sentiments"):
+            ids = [hotel_ID for hotel_ID in query.get("hotelIds", "").split(",") if hotel_ID]
+            if not ids or len(ids) > self.server.max_sentiment_ids:
+                self._send(400, {"errors": [{"status": 400, "code": 477, "title": "INVALID FORMAT", "source": {"parameter": "hotelIds"}}]})
+                return
+            data, warnings = [], []
+            for hotel_ID in ids:
+                sentiment = hotelSentiment(hotel_ID)
+                if sentiment is None:
+                    warnings.append({"code": 913, "title": "PROPERTIES NOT FOUND", "source": {"parameter": "hotelIds", "pointer": hotel_ID}})
+                else:
+                    data.append(sentiment)
+            body = {"data": data, "meta": {"count": len(data)}}
+            if warnings:
+                body["warnings"] = warnings
+            self._send(200, body)
+        else:
+            self._send(404, {"errors": [{"status": 404, "title": "Not Found"}]})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, max_sentiment_ids: int = MAX_SENTIMENT_IDS,
+                 rate_limit: float = 0.0, error_rate: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.max_sentiment_ids = max_sentiment_ids
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._recent = deque()  # times of the API calls in the last second
+
+    def throttled(self) -> bool:
+        """Whether this API call goes over rate_limit calls in the last second."""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0] <= now - 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.request_counts["429"] += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    def record(self, path: str):
+        with self._lock:
+            self.request_counts[path] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def startStubServer(port: int = 0, latency: float = 0.0, max_sentiment_ids: int = MAX_SENTIMENT_IDS,
+                    rate_limit: float = 0.0, error_rate: float = 0.0) -> StubServer:
+    """Starts the stub on a background thread and returns it; use server.base_url as the client's base_url."""
+    server = StubServer(("127.0.0.1", port), latency=latency, max_sentiment_ids=max_sentiment_ids,
+                        rate_limit=rate_limit, error_rate=error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Amadeus hotel endpoints")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="API calls per second before answering 429 (0 = no limit)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API calls that fail with a 503")
+    args = parser.parse_args()
+    server = StubServer(("127.0.0.1", args.port), latency=args.latency, rate_limit=args.rate_limit, error_rate=args.error_rate)
+    print(f"Amadeus stub listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import ToolMessage
+
+from ToolOutput import fitBudget
+from Tracing import tracer
+
+DEFAULT_TOOL_TIMEOUT = 30.0  # seconds
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class BasicToolNode:
+    """
+    A node that runs the tools requested in the last AIMessage.
+    Independent tool calls run at the same time (a thread pool for the sync path, asyncio.gather
+    for the async one), at most max_concurrency at once. A call that takes longer than its
+    timeout, or raises, turns into an error ToolMessage instead of stalling or failing the turn.
+    ToolMessages always come back in the order the calls were requested.
+    Text results are passed through as they are, other results as compact JSON, and with a
+    token_budget every result is cut to fit it (see ToolOutput).
+    """
+
+    def __init__(self, tools: list, timeout: float = DEFAULT_TOOL_TIMEOUT, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeouts: dict = None, token_budget: int = None) -> None:
+        """
+        timeout: default per-call timeout in seconds (None for no limit)
+        timeouts: optional per-tool overrides, {tool name: seconds}
+        token_budget: optional limit on the size of each tool result, in tokens
+        """
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.token_budget = token_budget
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tool")
+
+    def _timeoutFor(self, name: str):
+        return self.timeouts.get(name, self.timeout)
+
+    @staticmethod
+    def _lastMessage(inputs: dict):
+        if messages := inputs.get("messages", []):
+            return messages[-1]
+        raise ValueError("No message found in input")
+
+    def _toolMessage(self, tool_call: dict, tool_result) -> ToolMessage:
+        # strings go in as they are: dumping them again would only add quotes and escaping
+        if isinstance(tool_result, str):
+            content = tool_result
+        else:
+            content = json.dumps(tool_result, ensure_ascii=False, separators=(",", ":"), default=str)
+        if self.token_budget is not None:
+            content = fitBudget(content, self.token_budget)
+        return ToolMessage(
+            content=content,
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+        )
+
+    @staticmethod
+    def _errorMessage(tool_call: dict, error: str) -> ToolMessage:
+        return ToolMessage(
+            content=f"Error: {error}",
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
+
+    def _invoke(self, tool_call: dict):
+        with tracer.span(tool_call["name"], "tool"):
+            return self.tools_by_name[tool_call["name"]].invoke(tool_call["args"])
+
+    def __call__(self, inputs: dict):
+        message = self._lastMessage(inputs)
+        submitted = time.monotonic()
+        # each call runs in a copy of our context, so its span is a child of the current one
+        futures = [self._pool.submit(contextvars.copy_context().run, self._invoke, tool_call)
+                   for tool_call in message.tool_calls]
+        outputs = []
+        for tool_call, future in zip(message.tool_calls, futures):
+            # timeouts count from submission, so they include any wait for a free worker
+            timeout = self._timeoutFor(tool_call["name"])
+            remaining = None if timeout is None else max(0.0, submitted + timeout - time.monotonic())
+            try:
+                outputs.append(self._toolMessage(tool_call, future.result(timeout=remaining)))
+            except FutureTimeoutError:
+                future.cancel()  # a call that already started keeps running in the background
+                outputs.append(self._errorMessage(tool_call, f"{tool_call['name']} timed out after {timeout}s"))
+            except Exception as e:
+                outputs.append(self._errorMessage(tool_call, f"{type(e).__name__}: {e}"))
+        return {"messages": outputs}
+
+    async def acall(self, inputs: dict):
+        """Async version of __call__, awaiting tools that have a coroutine implementation."""
+        message = self._lastMessage(inputs)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def invoke(tool_call: dict):
+            tool = self.tools_by_name[tool_call["name"]]
+            async with semaphore:
+                with tracer.span(tool_call["name"], "tool"):
+                    if getattr(tool, "coroutine", None) is None:
+                        # sync-only tool: run it on our own pool rather than the loop's default executor
+                        return await asyncio.get_running_loop().run_in_executor(
+                            self._pool, contextvars.copy_context().run, tool.invoke, tool_call["args"])
+                    return await tool.ainvoke(tool_call["args"])
+
+        async def run(tool_call: dict) -> ToolMessage:
+            timeout = self._timeoutFor(tool_call["name"])
+            try:
+                tool_result = await asyncio.wait_for(invoke(tool_call), timeout)
+            except asyncio.TimeoutError:
+                return self._errorMessage(tool_call, f"{tool_call['name']} timed out after {timeout}s")
+            except Exception as e:
+                return self._errorMessage(tool_call, f"{type(e).__name__}: {e}")
+            return self._toolMessage(tool_call, tool_result)
+
+        outputs = await asyncio.gather(*(run(tool_call) for tool_call in message.tool_calls))
+        return {"messages": list(outputs)}
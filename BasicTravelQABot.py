@@ -1,13 +1,20 @@
-from gpt4all import GPT4All
+from ModelRegistry import getModel, preloadModel
 
-model = GPT4All(
+model = getModel(
     "Meta-Llama-3-8B-Instruct.Q4_0.gguf",
     device="gpu"
 )
-uinp = input("where would you like to travel? ")
-with model.chat_session():
-    hotels = model.generate(f"What are the three best budget hotels at {uinp}?", max_tokens=128)
-    print(hotels)
-    print("*******************")
-    result = model.generate(f"give a short description of each of these hotels:{hotels}")
-    print(result)
\ No newline at end of file
+
+def main():
+    # load the model while the user is typing
+    preloadModel("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")
+    uinp = input("where would you like to travel? ")
+    with model.chat_session():
+        hotels = model.generate(f"What are the three best budget hotels at {uinp}?", max_tokens=128)
+        print(hotels)
+        print("*******************")
+        result = model.generate(f"give a short description of each of these hotels:{hotels}")
+        print(result)
+
+if __name__ == "__main__":
+    main()
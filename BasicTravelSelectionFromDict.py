@@ -1,62 +1,19 @@
 from langchain.agents import Tool
-from gpt4all import GPT4All
 from langchain.agents import initialize_agent
-from langchain.llms.base import LLM
-from pydantic import PrivateAttr
-from langchain.schema import Generation, LLMResult
 import re
 
-class GPT4AllLangChain(LLM):
-    _model: GPT4All = PrivateAttr()
+from GPT4AllLangChain import GPT4AllLangChain
+from HotelCatalog import getCatalog
+from HotelSearch import searchDescriptions
+from IntentRouter import IntentRouter, RoutedAgent, hotelRoutes
+from LLMCache import getCache
 
-    def __init__(self, model_path, device="gpu", **kwargs):
-        super().__init__(**kwargs)
-        self._model = GPT4All(model_path, device=device)
-
-    @property
-    def _llm_type(self):
-        return "gpt4all"
-
-    def _call(self, prompt: str, stop=None):
-        with self._model.chat_session():
-            response = self._model.generate(prompt, max_tokens=200)  # Shorter responses
-            
-            if stop:
-                for stop_seq in stop:
-                    if stop_seq in response:
-                        response = response.split(stop_seq)[0]
-                        break
-            
-            return response
-    
-    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop=stop)
-            generations.append([Generation(text=text)])
-        return LLMResult(generations=generations)
-hotels = {
-    "Paris": ["Hotel A", "Hotel B", "Hotel C"],
-    "New York": ["Hotel D", "Hotel E", "Hotel F"],
-    "Tokyo": ["Hotel G", "Hotel H", "Hotel I"]
-}
-hotel_descriptions = {
-    "Hotel A": "A budget-friendly hotel with basic amenities.",
-    "Hotel B": "A mid-range hotel with comfortable rooms and free breakfast.",
-    "Hotel C": "A luxury hotel with a spa and fine dining.",
-    "Hotel D": "A budget hotel located in the heart of the city.",
-    "Hotel E": "A boutique hotel with unique decor and personalized service.",
-    "Hotel F": "A family-friendly hotel with a pool and play area.",
-    "Hotel G": "A modern hotel with stunning views of the city skyline.",
-    "Hotel H": "An eco-friendly hotel with sustainable practices.",
-    "Hotel I": "A traditional hotel with a rich history."
-}
 def getHotels(inp: str) -> str:
     print(f"[DEBUG] Tool received input: '{inp}'")
-    city = inp.split(" in ")[-1] if " in " in inp else inp
-    city = city.strip("'\" ")
-    if city in hotels:
-        hotel_list = {"hotels": hotels[city]} 
+    # matches case, accents, aliases like "NYC" and free text like "hotels in Paris"
+    city = getCatalog().resolveCity(inp.strip("'\" "))
+    if city is not None:
+        hotel_list = {"hotels": getCatalog().hotelsIn(city)} 
         print(f"[DEBUG] Found hotels: {hotel_list}")
         return hotel_list
     else:
@@ -69,19 +26,84 @@ findHotels = Tool(
 def GetHotelDescription(hotelName: str) -> str:
     hotelName = hotelName.strip("'\" ")
     print(f"[DEBUG] Tool received input: '{hotelName}'")
-    description = hotel_descriptions.get(hotelName, "No description available for this hotel.")
+    description = getCatalog().describe(hotelName) or "No description available for this hotel."
     print(f"[DEBUG] Description: {description}")
     return description
 describeHotels = Tool(
     name="describeHotels",
-    description="Returns a description of a given hotel name, you don't need the city, just the name. It can only handle one hotel at once. Call with 'describeHotels <hotel_name>'.",
+    description="Returns a description of a given hotel name, you don't need the city, just the name. It can only handle one hotel at once. Call with 'describeHotels <hotel_name>'. For several hotels use describeHotelsBatch.",
     func=GetHotelDescription
 )
-wrapped_model = GPT4AllLangChain("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")
+
+def _parseNames(inp: str) -> list:
+    """Names from 'A, B and C', "['A', 'B']" or "{'hotels': ['A', 'B']}" (the agent passes any of these)."""
+    quoted = re.findall(r"['\"]([^'\"]+)['\"]", inp)
+    names = [name for name in quoted if name != "hotels"] if quoted else re.split(r",|\band\b", inp)
+    return [name.strip(" []{}") for name in names if name.strip(" []{}")]
+
+def GetHotelDescriptions(inp: str) -> dict:
+    print(f"[DEBUG] Tool received input: '{inp}'")
+    names = _parseNames(inp)
+    catalog = getCatalog()
+    if len(names) == 1 and catalog.describe(names[0]) is None and catalog.resolveCity(names[0]):
+        descriptions = catalog.describeCity(names[0])  # a city: describe every hotel in it
+    else:
+        descriptions = catalog.describeMany(names)
+    result = {"hotels": [{"name": name, "description": description or "No description available for this hotel."}
+                         for name, description in descriptions.items()]}
+    print(f"[DEBUG] Descriptions: {result}")
+    return result
+describeHotelsBatch = Tool(
+    name="describeHotelsBatch",
+    description="Returns the descriptions of several hotels at once, or of every hotel in a city. Call with 'describeHotelsBatch <hotel_name>, <hotel_name>, ...' or 'describeHotelsBatch <city>'.",
+    func=GetHotelDescriptions
+)
+
+def GetHotelsInCities(inp: str) -> dict:
+    print(f"[DEBUG] Tool received input: '{inp}'")
+    found = getCatalog().hotelsInMany(_parseNames(inp))
+    result = {"cities": {city: hotels or "No hotels found for this city." for city, hotels in found.items()}}
+    print(f"[DEBUG] Found hotels: {result}")
+    return result
+findHotelsBatch = Tool(
+    name="findHotelsBatch",
+    description="Returns the hotels in each of several cities at once. Call with 'findHotelsBatch <city>, <city>, ...'.",
+    func=GetHotelsInCities
+)
+def SearchHotelDescriptions(inp: str) -> str:
+    print(f"[DEBUG] Tool received input: '{inp}'")
+    query, _, city = inp.strip("'\" ").partition("|")
+    results = searchDescriptions(query.strip(), city=city.strip() or None)
+    print(f"[DEBUG] Matches: {results}")
+    return results
+searchHotelDescriptions = Tool(
+    name="searchHotelDescriptions",
+    description="Finds the hotels whose descriptions best match what the user is looking for, with their descriptions, in one call. Call with 'searchHotelDescriptions <what to look for>', or 'searchHotelDescriptions <what to look for> | <city>' to stay in one city.",
+    func=SearchHotelDescriptions
+)
+# sampled cool enough for LLMCache to keep the answers, so repeated questions skip the model
+wrapped_model = GPT4AllLangChain("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu", temp=0.3,
+                                 cache=getCache().asLangChainCache())
+
+# the routes answer the user directly, so the tools' dicts are turned into plain text
+def _routedHotels(city: str) -> str:
+    found = getHotels(city)
+    return ", ".join(found["hotels"]) if isinstance(found, dict) else found
+
+def _describeListed(match):
+    names = _parseNames(match["names"])
+    if not names or None in getCatalog().describeMany(names).values():
+        return None  # something the catalog doesn't know, let the agent work it out
+    return "\n".join(f"{hotel['name']}: {hotel['description']}" for hotel in GetHotelDescriptions(match["names"])["hotels"])
+
+# requests that are just a tool call are answered straight from the tools
+router = IntentRouter(hotelRoutes(find=_routedHotels, describe=GetHotelDescription))
+router.add("describe_listed", r"(?:please\s+)?(?:give|write)?\s*(?:me\s+)?(?:a\s+)?(?:short\s+)?descriptions?\s+of\s+"
+           r"(?:each\s+of\s+)?(?:these|the\s+following)\s+hotels?(?:\s+names)?\s*:\s*(?P<names>.+)", _describeListed)
 
 # Simpler agent setup
 agent = initialize_agent(
-    [findHotels, describeHotels],
+    [findHotels, describeHotels, findHotelsBatch, describeHotelsBatch, searchHotelDescriptions],
     wrapped_model,
     agent_type="zero-shot-react-description",
     verbose=True,
@@ -90,13 +112,19 @@ agent = initialize_agent(
         "prefix": "You are a travel assistant. Use the tools when needed, otherwise answer directly."
     }
 )
+agent = RoutedAgent(agent, router)
+
+def main():
+    print("=== TESTING ===")
+    hotel_options = agent.run("please get me the name of some hotels in Paris")
+    print(hotel_options)
+    result = agent.run(f"give a short description of each of these hotel names: {str(hotel_options)}")
+    print(f"\n=== FINAL RESULT: {result} ===")
 
-print("=== TESTING ===")
-hotel_options = agent.run("please get me the name of some hotels in Paris")
-print(hotel_options)
-result = agent.run(f"give a short description of each of these hotel names: {str(hotel_options)}")
-print(f"\n=== FINAL RESULT: {result} ===")
+    # Also test the tool directly
+    direct_result = describeHotels("Hotel A")
+    print(f"Direct tool result: {direct_result}")
+    print(router.report())
 
-# Also test the tool directly
-direct_result = describeHotels("Hotel A")
-print(f"Direct tool result: {direct_result}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Offline benchmarks for the bots, with no GPU model, OpenAI key or Amadeus account needed.
+The models are replaced by the scripted ones in FakeModels.py and Amadeus by AmadeusStub (with
+optional added latency), then we time:
+
+    chat_turns      one conversation through the UsingChatGPT graph: per-turn latency percentiles
+    concurrency     N conversations at once through the same graph: throughput and latency
+    local_turns     the LangGraphBasicTravelSelection graph over a scripted GPT4All
+    model_pool      N conversations at once through GPT4AllLangChain on a ModelPool of scripted workers
+    tool_dispatch   what BasicToolNode adds on top of calling the tools directly
+    parse_render    HotelList parsing, rendering and shaping, and searchHotels against the stub
+
+Results are written as JSON, and --compare prints the change against an earlier run:
+
+    python Benchmark.py --json before.json
+    python Benchmark.py --json after.json --compare before.json
+
+--trace 1 traces every turn (see Tracing.py) and adds the per-span breakdown to the output;
+--trace-path and --metrics-path keep the trace and the Prometheus metrics.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from AmadeusStub import startStubServer
+from Tracing import tracer
+
+BENCHMARKS = ["chat_turns", "concurrency", "local_turns", "model_pool", "tool_dispatch", "parse_render"]
+
+# metrics where a bigger number is better; for everything else (times) smaller is better
+HIGHER_IS_BETTER = ("per_second", "throughput")
+
+
+def percentiles(samples: list) -> dict:
+    """Summary of a list of durations in seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return 1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": 1000 * statistics.fmean(ordered),
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p99_ms": at(0.99),
+        "max_ms": 1000 * ordered[-1],
+    }
+
+
+def timed(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def prompts(count: int, seed: int = 0) -> list:
+    """User messages with coordinates scattered around a few cities, so searches don't all hit the cache."""
+    rng = random.Random(seed)
+    centres = [(35.69, 139.70), (48.85, 2.35), (40.75, -73.98), (51.51, -0.13)]
+    messages = []
+    for i in range(count):
+        lat, lon = centres[i % len(centres)]
+        lat, lon = round(lat + rng.uniform(-0.05, 0.05), 4), round(lon + rng.uniform(-0.05, 0.05), 4)
+        if i % 5 == 4:
+            lat2, lon2 = round(lat + 0.02, 4), round(lon + 0.02, 4)
+            messages.append(f"Compare hotels near {lat}, {lon} and {lat2}, {lon2}")
+        else:
+            messages.append(f"Find me a hotel near {lat}, {lon}")
+    return messages
+
+
+def chatGraph(llm_latency: float):
+    import UsingChatGPT
+    from BasicToolNode import BasicToolNode
+    from FakeModels import FakeToolChatModel
+    from ToolOutput import DEFAULT_TOKEN_BUDGET
+    tool_node = BasicToolNode(UsingChatGPT.tools, timeout=30, max_concurrency=8, token_budget=2 * DEFAULT_TOKEN_BUDGET)
+    return UsingChatGPT.buildGraph(FakeToolChatModel(latency=llm_latency), tool_node)
+
+
+def benchChatTurns(args) -> dict:
+    graph = chatGraph(args.llm_latency)
+    messages = []
+    samples = []
+    for prompt in prompts(args.turns):
+        start = time.perf_counter()
+        with tracer.span("turn", "turn"):
+            result = graph.invoke({"messages": messages + [{"role": "user", "content": prompt}]})
+        samples.append(time.perf_counter() - start)
+        messages = result["messages"]
+    return {"turn_latency": percentiles(samples), "final_messages": len(messages)}
+
+
+def benchConcurrency(args) -> dict:
+    graph = chatGraph(args.llm_latency)
+    samples = []
+
+    async def conversation(index: int):
+        messages = []
+        for prompt in prompts(args.turns, seed=index + 1):
+            start = time.perf_counter()
+            with tracer.span("turn", "turn"):
+                result = await graph.ainvoke({"messages": messages + [{"role": "user", "content": prompt}]})
+            samples.append(time.perf_counter() - start)
+            messages = result["messages"]
+
+    async def run():
+        await asyncio.gather(*(conversation(index) for index in range(args.conversations)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    return {
+        "conversations": args.conversations,
+        "turns": len(samples),
+        "elapsed_s": elapsed,
+        "throughput_turns_per_second": len(samples) / elapsed,
+        "turn_latency": percentiles(samples),
+    }
+
+
+def benchLocalTurns(args) -> dict:
+    from FakeModels import ScriptedGPT4All
+    from langchain_core.messages import HumanMessage
+    with contextlib.redirect_stdout(io.StringIO()):  # the script prints its graph on import
+        import LangGraphBasicTravelSelection as local
+    model = ScriptedGPT4All(seconds_per_prompt_char=args.prompt_char_latency, seconds_per_token=args.token_latency)
+    wrapper = local.ChatLLMWrapper(model, reuse_session=True, token_budget=1200)
+    graph = local.buildGraph(wrapper)
+    messages = []
+    samples = []
+    tokens = 0
+    for i in range(args.turns):
+        start = time.perf_counter()
+        with tracer.span("turn", "turn"):
+            result = graph.invoke({"messages": messages + [HumanMessage(content=f"Question {i}: where should I stay?", id=f"human-{i}")]})
+        samples.append(time.perf_counter() - start)
+        messages = result["messages"]
+        tokens += len(messages[-1].content.split())
+    return {
+        "turn_latency": percentiles(samples),
+        "tokens_per_second": tokens / sum(samples),
+        "prompt_chars_processed": wrapper.session.stats()["processed_chars"],
+        "prompt_reuse_ratio": wrapper.session.stats()["reuse_ratio"],
+    }
+
+
+def benchModelPool(args) -> dict:
+    import functools
+    from FakeModels import scriptedModel
+    from GPT4AllLangChain import GPT4AllLangChain
+    from ModelPool import ModelPool
+    factory = functools.partial(scriptedModel, seconds_per_prompt_char=args.prompt_char_latency,
+                                seconds_per_token=args.token_latency)
+    pool = ModelPool("scripted", workers=args.pool_workers, model_factory=factory)
+    llm = GPT4AllLangChain("scripted", pool=pool, temp=0.3)
+    samples = []
+
+    async def conversation(index: int):
+        history = ""
+        for i in range(args.turns):
+            history += f"Human: Question {i}: where should I stay?\nAssistant:"
+            start = time.perf_counter()
+            with tracer.span("turn", "turn"):
+                reply = await llm.ainvoke(history, stop=["Human:"], conversation_id=f"conversation-{index}")
+            samples.append(time.perf_counter() - start)
+            history += reply + "\n"
+
+    try:
+        pool.submit("warm up", max_tokens=1).result()  # wait for the workers to start
+        start = time.perf_counter()
+
+        async def run():
+            await asyncio.gather(*(conversation(index) for index in range(args.conversations)))
+
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        stats = pool.stats()
+    finally:
+        pool.close()
+    return {
+        "workers": args.pool_workers,
+        "conversations": args.conversations,
+        "turns": len(samples),
+        "elapsed_s": elapsed,
+        "throughput_turns_per_second": len(samples) / elapsed,
+        "turn_latency": percentiles(samples),
+        "worker_utilisation": [round(worker["utilisation"], 3) for worker in stats["workers"]],
+    }
+
+
+def benchToolDispatch(args) -> dict:
+    from langchain_core.messages import AIMessage
+    from langchain_core.tools import tool
+    from BasicToolNode import BasicToolNode
+
+    @tool
+    def noop(value: int) -> str:
+        """Returns its input."""
+        return str(value)
+
+    calls = [{"name": "noop", "args": {"value": i}, "id": f"call_{i}"} for i in range(args.tool_calls)]
+    state = {"messages": [AIMessage(content="", tool_calls=calls)]}
+    node = BasicToolNode([noop])
+    direct = timed(lambda: [noop.invoke(call["args"]) for call in calls], args.repeat)
+    sync = timed(lambda: node(state), args.repeat)
+
+    async def runAsync():
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await node.acall(state)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    asynchronous = asyncio.run(runAsync())
+    return {
+        "tool_calls_per_turn": args.tool_calls,
+        "direct": percentiles(direct),
+        "node_sync": percentiles(sync),
+        "node_async": percentiles(asynchronous),
+        "overhead_sync_ms": 1000 * (statistics.median(sync) - statistics.median(direct)),
+        "overhead_async_ms": 1000 * (statistics.median(asynchronous) - statistics.median(direct)),
+    }
+
+
+def benchParseRender(args) -> dict:
+    import requests
+    from AmadeusCall import AmadeusClient, HOTELS_BY_GEOCODE_PATH
+    from HotelRecords import HotelList
+    from ToolOutput import shapeHotels
+    client = AmadeusClient(base_url=args.base_url)
+    response = client._get(HOTELS_BY_GEOCODE_PATH, {"latitude": 35.69, "longitude": 139.70, "radius": 3, "radiusUnit": "KM"})
+    hotels = HotelList.fromJson(response)
+    raw = json.dumps(response)
+    parse = timed(lambda: HotelList.fromJson(json.loads(raw)), args.repeat)
+    render = timed(hotels.render, args.repeat)
+    shape = timed(lambda: shapeHotels(hotels), args.repeat)
+    # each search in a different place, so none is answered from the cache or the index
+    places = iter([(35.0 + 0.1 * i, 139.0) for i in range(args.repeat)])
+    search = timed(lambda: client.searchHotels(*next(places), 1), args.repeat)
+    return {
+        "hotels_per_response": len(hotels),
+        "response_bytes": len(raw),
+        "rendered_chars": len(hotels.render()),
+        "shaped_chars": len(shapeHotels(hotels)),
+        "parse": percentiles(parse),
+        "render": percentiles(render),
+        "shape": percentiles(shape),
+        "search_hotels": percentiles(search),
+    }
+
+
+RUNNERS = {
+    "chat_turns": benchChatTurns,
+    "concurrency": benchConcurrency,
+    "local_turns": benchLocalTurns,
+    "model_pool": benchModelPool,
+    "tool_dispatch": benchToolDispatch,
+    "parse_render": benchParseRender,
+}
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    """Prints every metric that changed by more than 5% against the previous run."""
+    old = flatten(previous["results"])
+    new = flatten(current["results"])
+    print(f"\n{'metric':58} {'before':>12} {'after':>12} {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        if not old[name] or name.endswith(".n"):
+            continue
+        change = (new[name] - old[name]) / abs(old[name])
+        if abs(change) < 0.05:
+            continue
+        better = (change > 0) == any(marker in name for marker in HIGHER_IS_BETTER)
+        print(f"{name:58} {old[name]:12.3f} {new[name]:12.3f} {change:+7.0%} {'better' if better else 'worse'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks with fake models and a stub Amadeus server")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS, help="benchmark to run (default: all)")
+    parser.add_argument("--turns", type=int, default=20, help="turns per conversation")
+    parser.add_argument("--conversations", type=int, default=8, help="conversations at once for the concurrency benchmark")
+    parser.add_argument("--repeat", type=int, default=200, help="repetitions for the micro benchmarks")
+    parser.add_argument("--pool-workers", type=int, default=2, help="worker processes for the model_pool benchmark")
+    parser.add_argument("--tool-calls", type=int, default=4, help="tool calls per turn in the dispatch benchmark")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub adds to every Amadeus request")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake chat model call")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per token of the scripted GPT4All")
+    parser.add_argument("--prompt-char-latency", type=float, default=0.00002,
+                        help="seconds per prompt character the scripted GPT4All processes")
+    parser.add_argument("--trace", type=float, default=0.0, help="share of turns to trace (0 = tracing off)")
+    parser.add_argument("--trace-path", help="JSONL file for the trace events")
+    parser.add_argument("--metrics-path", help="file for the metrics in Prometheus text format")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    server = startStubServer(latency=args.latency)
+    args.base_url = server.base_url
+    # everything below talks to the stub and the fake models only
+    os.environ["AMADEUS_BASE_URL"] = server.base_url
+    os.environ.setdefault("AMADEUS_API_KEY", "benchmark")
+    os.environ.setdefault("AMADEUS_API_SECRET", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("AMADEUS_RATE_LIMIT", "0")  # the stub has no quota; measure the code, not the pacing
+    for variable in ("AMADEUS_CACHE_PATH", "AMADEUS_CASSETTE", "LLM_CACHE_PATH", "CONVERSATION_PATH"):
+        os.environ.pop(variable, None)
+
+    tracer.configure(sample_rate=args.trace, path=args.trace_path)
+    tracer.metrics_path = args.metrics_path
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"running {name}...", flush=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = RUNNERS[name](args)
+        print(json.dumps(results[name], indent=2))
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+            "stub_requests": dict(server.request_counts),
+        },
+        "results": results,
+    }
+    server.shutdown()
+    if tracer.enabled:
+        print(tracer.summary())
+        tracer.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
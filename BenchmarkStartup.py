@@ -0,0 +1,88 @@
+"""
+Startup benchmark for the entry points.
+Each entry point is imported in a fresh interpreter and timed, then the shared model is asked for
+one token to measure how long a user waits for the first output.
+
+    python BenchmarkStartup.py
+    python BenchmarkStartup.py --entry FirstSteps --no-ttft --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = [
+    "FirstSteps",
+    "BasicTravelQABot",
+    "TestFirstTools",
+    "BasicTravelSelectionFromDict",
+    "LangGraphBasicTravelSelection",
+    "UsingChatGPT",
+]
+
+# runs inside the child interpreter
+CHILD = """
+import contextlib, importlib, io, json, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+result = {"entry": sys.argv[1], "import_s": imported - start}
+if sys.argv[2] == "1":
+    from ModelRegistry import getModel
+    model = getModel(device=sys.argv[3])
+    first = []
+
+    def first_token(token_id, token):
+        first.append(time.perf_counter())
+        return False
+
+    model.generate("Hi", max_tokens=1, callback=first_token)
+    if first:
+        result["first_token_after_import_s"] = first[0] - imported
+        result["time_to_first_token_s"] = first[0] - start
+print(json.dumps(result))
+"""
+
+
+def measure(entry: str, ttft: bool = True, device: str = "gpu") -> dict:
+    process = subprocess.run(
+        [sys.executable, "-c", CHILD, entry, "1" if ttft else "0", device],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        stdin=subprocess.DEVNULL,
+    )
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        return {"entry": entry, "error": error[-1] if error else f"exit code {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time-to-first-token per entry point")
+    parser.add_argument("--entry", action="append", help="entry point module to measure (default: all)")
+    parser.add_argument("--no-ttft", action="store_true", help="only measure import time")
+    parser.add_argument("--device", default="gpu")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'entry point':32} {'import':>10} {'first token':>12}")
+    for entry in args.entry or ENTRY_POINTS:
+        result = measure(entry, ttft=not args.no_ttft, device=args.device)
+        results.append(result)
+        if "error" in result:
+            print(f"{entry:32} failed: {result['error']}")
+            continue
+        ttft = result.get("time_to_first_token_s")
+        ttft_text = f"{ttft:11.2f}s" if ttft is not None else f"{'-':>12}"
+        print(f"{entry:32} {result['import_s']:9.2f}s {ttft_text}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
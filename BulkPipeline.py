@@ -0,0 +1,386 @@
+"""
+Bulk enrichment of hotel location files.
+Reads a CSV of hotels (Name, Address, and optionally Latitude/Longitude) a row at a time,
+geocodes the addresses, and searches Amadeus around each one. Every row is written out with:
+
+- the Amadeus ID of the hotel, when one of the nearby results has a matching name;
+- the nearest hotels, with distances and ratings.
+
+Output is JSONL, or Parquet part files when pyarrow is installed. Rows go out in input order.
+Progress is checkpointed next to the output, so a crashed run picks up where it stopped:
+
+    python BulkPipeline.py testLocations.csv enriched.jsonl --geocoder nominatim
+    python BulkPipeline.py big.csv enriched.parquet --concurrency 8        # run again to resume
+
+Geocoders are pluggable. The built-in ones are "nominatim" (OpenStreetMap, one request per
+second) and "hash" (made-up coordinates for offline runs against AmadeusStub or a cassette).
+"module:factory" loads any other. Results are cached in a SQLite file (--geocode-cache), so
+a rerun or a resumed run doesn't geocode the same address twice.
+"""
+import argparse
+import csv
+import difflib
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from AmadeusCall import getClient
+from HotelCatalog import normalize
+from RateLimiter import TokenBucket
+
+DEFAULT_RADIUS = 1  # km
+DEFAULT_NEARBY = 5
+MATCH_THRESHOLD = 0.75  # name similarity needed to take a nearby hotel's Amadeus ID
+CHECKPOINT_EVERY = 100  # rows
+
+
+def readLocations(path: str):
+    """
+    Yields (row number, row) from a CSV with a header row, a row at a time.
+    Addresses with commas should be quoted. When they aren't, the extra fields are joined back
+    into the last column, as HotelCatalog.loadCsv does.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [normalize(column).replace(" ", "_") for column in next(reader, [])]
+        number = 0
+        for row in reader:
+            if not any(row):
+                continue
+            if len(row) > len(header):
+                row = row[:len(header) - 1] + [",".join(row[len(header) - 1:])]
+            yield number, dict(zip(header, (value.strip() for value in row)))
+            number += 1
+
+
+# --- geocoders: geocode(address) returns (latitude, longitude) or None ---
+
+class NominatimGeocoder:
+    """OpenStreetMap's geocoder, kept to its usage policy of one request per second."""
+    URL = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, user_agent: str = "travel-hotel-pipeline", rate: float = 1.0):
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        self.limiter = TokenBucket(rate, 1)
+
+    def _search(self, query: str):
+        self.limiter.acquire()
+        response = self.session.get(self.URL, params={"q": query, "format": "json", "limit": 1}, timeout=30)
+        response.raise_for_status()
+        results = response.json()
+        return (float(results[0]["lat"]), float(results[0]["lon"])) if results else None
+
+    def geocode(self, address: str):
+        # block-style addresses ("1-29 Kabukicho, ...") are often unknown, the district rarely is
+        parts = [part.strip() for part in address.split(",") if part.strip()]
+        for start in range(max(1, len(parts) - 1)):
+            found = self._search(", ".join(parts[start:]))
+            if found is not None:
+                return found
+        return None
+
+
+class HashGeocoder:
+    """Made-up but stable coordinates (a point within spread degrees of centre) for offline runs."""
+
+    def __init__(self, centre=(35.69, 139.70), spread: float = 0.05):
+        self.centre = centre
+        self.spread = spread
+
+    def geocode(self, address: str):
+        h = int(hashlib.md5(normalize(address).encode()).hexdigest(), 16)
+        lat = self.centre[0] + ((h % 10000) / 10000 - 0.5) * 2 * self.spread
+        lon = self.centre[1] + ((h // 10000 % 10000) / 10000 - 0.5) * 2 * self.spread
+        return round(lat, 5), round(lon, 5)
+
+
+GEOCODERS = {"nominatim": NominatimGeocoder, "hash": HashGeocoder}
+
+
+def loadGeocoder(spec: str):
+    """A built-in geocoder by name, or "module:factory" for one of your own."""
+    if spec in GEOCODERS:
+        return GEOCODERS[spec]()
+    module, _, factory = spec.partition(":")
+    if not factory:
+        raise ValueError(f"Unknown geocoder {spec!r}: use one of {sorted(GEOCODERS)} or module:factory")
+    return getattr(importlib.import_module(module), factory)()
+
+
+class CachedGeocoder:
+    """
+    Geocoder in front of another, remembering every answer (addresses it couldn't find too)
+    in memory and, with a path, in a SQLite file.
+    """
+
+    def __init__(self, geocoder, path: str = None):
+        self.geocoder = geocoder
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS geocodes (address TEXT PRIMARY KEY, latitude REAL, longitude REAL)")
+        self._db.commit()
+
+    def geocode(self, address: str):
+        key = normalize(address)
+        with self._lock:
+            if key in self._memory:
+                self.hits += 1
+                return self._memory[key]
+            row = self._db.execute("SELECT latitude, longitude FROM geocodes WHERE address = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self._memory[key] = None if row[0] is None else (row[0], row[1])
+                return self._memory[key]
+            self.misses += 1
+        found = self.geocoder.geocode(address)
+        with self._lock:
+            self._memory[key] = found
+            self._db.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?)",
+                             (key, *(found if found is not None else (None, None))))
+            self._db.commit()
+        return found
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# --- enrichment ---
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, normalize(a), normalize(b)).ratio()
+
+
+def enrich(row: dict, geocoder, radius: float = DEFAULT_RADIUS, nearby: int = DEFAULT_NEARBY) -> dict:
+    """One output record for a CSV row. Failures are recorded in its "error" field, not raised."""
+    name = row.get("name", "")
+    address = row.get("address", "")
+    record = {"name": name, "address": address, "latitude": None, "longitude": None, "amadeus_id": None,
+              "match_score": None, "rating": None, "nearby": [], "error": None}
+    try:
+        if row.get("latitude") and row.get("longitude"):
+            coords = float(row["latitude"]), float(row["longitude"])
+        else:
+            coords = geocoder.geocode(address)
+        if coords is None:
+            record["error"] = "address not found"
+            return record
+        record["latitude"], record["longitude"] = coords
+        client = getClient()
+        hotels = client.searchHotels(coords[0], coords[1], radius)
+        if hotels:
+            score, best = max(((_similarity(name, hotel.name), hotel) for hotel in hotels), key=lambda pair: pair[0])
+            if score >= MATCH_THRESHOLD:
+                record["amadeus_id"], record["match_score"] = best.hotelId, round(score, 3)
+        closest = sorted(hotels, key=lambda hotel: hotel.distance if hotel.distance is not None else float("inf"))[:nearby]
+        wanted = [hotel.hotelId for hotel in closest]
+        if record["amadeus_id"] and record["amadeus_id"] not in wanted:
+            wanted.append(record["amadeus_id"])
+        ratings = client.getRatings(wanted) if wanted else {}
+
+        def overall(hotel_ID):
+            rating = ratings.get(hotel_ID)
+            if rating is None or not rating.available:
+                return None
+            # Rating.fromJson fills in "Unknown" when Amadeus leaves the score out
+            try:
+                return int(rating.overallRating)
+            except (TypeError, ValueError):
+                return None
+
+        record["rating"] = overall(record["amadeus_id"])
+        record["nearby"] = [{"hotel_id": hotel.hotelId, "name": hotel.name, "distance_km": hotel.distance,
+                             "rating": overall(hotel.hotelId)} for hotel in closest]
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def boundedMap(func, items, concurrency: int):
+    """
+    func over items on a thread pool, results yielded in input order, with at most
+    2 * concurrency items taken from the (possibly huge) iterator at any time.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk") as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- output with checkpoints ---
+
+class JsonlSink:
+    def __init__(self, path: str, resume_size: int = None):
+        """resume_size: output size at the last checkpoint; anything written after it is cut off"""
+        self.path = path
+        if resume_size is not None:
+            size = os.path.getsize(path) if os.path.exists(path) else None
+            if size is None or size < resume_size:
+                # truncate() would pad the gap with NUL bytes
+                raise ValueError(f"{path} is {'missing' if size is None else f'{size} bytes'} but the checkpoint expects "
+                                 f"{resume_size} bytes; pass --restart to start over")
+        self._file = open(path, "r+b" if resume_size is not None else "wb")
+        if resume_size is not None:
+            self._file.truncate(resume_size)
+            self._file.seek(resume_size)
+
+    def write(self, record: dict):
+        self._file.write((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+
+    def flush(self) -> int:
+        """Makes everything written so far durable; returns the position to resume from."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Parquet dataset: a directory with one part file per checkpoint, readable as one table."""
+
+    def __init__(self, path: str, resume_size: int = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow), or write .jsonl instead")
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        # fixed, so a part whose rows are all unmatched still reads as the same table as the rest
+        self._schema = pyarrow.schema([
+            ("name", pyarrow.string()), ("address", pyarrow.string()),
+            ("latitude", pyarrow.float64()), ("longitude", pyarrow.float64()),
+            ("amadeus_id", pyarrow.string()), ("match_score", pyarrow.float64()), ("rating", pyarrow.int64()),
+            ("nearby", pyarrow.string()),  # JSON list of {hotel_id, name, distance_km, rating}
+            ("error", pyarrow.string()),
+        ])
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.parts = resume_size or 0
+        missing = [part for part in range(self.parts) if not os.path.exists(os.path.join(path, f"part-{part:05d}.parquet"))]
+        if missing:
+            raise ValueError(f"{path} lacks part {missing[0]} of the {self.parts} the checkpoint expects; pass --restart to start over")
+        # part files after the checkpoint come from the crashed run and are rewritten
+        for name in os.listdir(path):
+            if name.startswith("part-") and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(path, name))
+        self._rows = []
+
+    def write(self, record: dict):
+        self._rows.append(dict(record, nearby=json.dumps(record["nearby"], ensure_ascii=False)))
+
+    def flush(self) -> int:
+        if self._rows:
+            table = self._pyarrow.Table.from_pylist(self._rows, schema=self._schema)
+            self._parquet.write_table(table, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+            self.parts += 1
+            self._rows = []
+        return self.parts
+
+    def close(self):
+        self.flush()
+
+
+class Checkpoint:
+    """Rows done and output position, replaced atomically next to the output."""
+
+    def __init__(self, output: str):
+        self.path = output.rstrip("/\\") + ".checkpoint.json"
+
+    def load(self, source: str) -> dict:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("input") != os.path.abspath(source):
+            raise ValueError(f"{self.path} belongs to a run over {state.get('input')}; pass --restart to start over")
+        return state
+
+    def save(self, source: str, rows_done: int, position: int, done: bool = False):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"input": os.path.abspath(source), "rows_done": rows_done, "position": position, "done": done}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def run(source: str, output: str, geocoder, radius: float = DEFAULT_RADIUS, nearby: int = DEFAULT_NEARBY,
+        concurrency: int = 4, restart: bool = False, checkpoint_every: int = CHECKPOINT_EVERY, progress=sys.stderr) -> dict:
+    """Enriches every row of source into output, resuming an earlier run over the same file unless restart."""
+    checkpoint = Checkpoint(output)
+    if restart:
+        checkpoint.clear()
+    state = checkpoint.load(source)
+    if state is not None and state.get("done"):
+        print(f"{output} is already complete ({state['rows_done']} rows); pass --restart to redo it", file=progress)
+        return {"rows": 0, "resumed_from": state["rows_done"]}
+    skip = state["rows_done"] if state else 0
+    sink_type = ParquetSink if output.endswith(".parquet") else JsonlSink
+    sink = sink_type(output, state["position"] if state else None)
+
+    rows_done = skip
+    counts = {"rows": 0, "matched": 0, "errors": 0}
+    start = time.perf_counter()
+    rows = (row for number, row in readLocations(source) if number >= skip)
+    try:
+        for record in boundedMap(lambda row: enrich(row, geocoder, radius, nearby), rows, concurrency):
+            sink.write(record)
+            rows_done += 1
+            counts["rows"] += 1
+            counts["matched"] += record["amadeus_id"] is not None
+            counts["errors"] += record["error"] is not None
+            if counts["rows"] % checkpoint_every == 0:
+                checkpoint.save(source, rows_done, sink.flush())
+                elapsed = time.perf_counter() - start
+                print(f"{rows_done} rows ({counts['rows'] / elapsed:.1f}/s, {counts['matched']} matched, "
+                      f"{counts['errors']} errors)", file=progress, flush=True)
+        checkpoint.save(source, rows_done, sink.flush(), done=True)
+    finally:
+        sink.close()
+    counts["resumed_from"] = skip
+    counts["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich a hotel CSV with Amadeus IDs, nearby hotels and ratings")
+    parser.add_argument("input", help="CSV with Name and Address columns (Latitude/Longitude are used when present)")
+    parser.add_argument("output", help="output file: .jsonl, or .parquet for a Parquet dataset directory")
+    parser.add_argument("--geocoder", default="nominatim", help=f"one of {sorted(GEOCODERS)}, or module:factory")
+    parser.add_argument("--geocode-cache", default="geocode_cache.sqlite", help="SQLite file for geocoding results")
+    parser.add_argument("--radius", type=float, default=DEFAULT_RADIUS, help="search radius in km")
+    parser.add_argument("--nearby", type=int, default=DEFAULT_NEARBY, help="nearby hotels kept per row")
+    parser.add_argument("--concurrency", type=int, default=4, help="rows processed at once")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="rows between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore an earlier checkpoint and start over")
+    args = parser.parse_args()
+
+    geocoder = CachedGeocoder(loadGeocoder(args.geocoder), args.geocode_cache)
+    counts = run(args.input, args.output, geocoder, radius=args.radius, nearby=args.nearby, concurrency=args.concurrency,
+                 restart=args.restart, checkpoint_every=args.checkpoint_every)
+    print(json.dumps(dict(counts, geocoder=geocoder.stats(), amadeus=getClient().stats())))
+
+
+if __name__ == "__main__":
+    main()
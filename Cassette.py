@@ -0,0 +1,172 @@
+"""
+Record/replay of HTTP traffic for the Amadeus client.
+In record mode every request goes out as usual and the request/response pair is appended to a
+cassette file: gzipped JSONL (plain JSONL if the name doesn't end in .gz), one pair per line.
+Credentials are never stored. Request bodies and headers are left out, and tokens in the
+responses are replaced. In replay mode the same requests are answered from the file with no
+network access and optional added latency. A request that isn't in the cassette raises
+CassetteMiss.
+
+    AMADEUS_CASSETTE=tokyo.jsonl.gz AMADEUS_CASSETTE_MODE=record python AmadeusCall.py
+    python AmadeusCall.py --cassette tokyo.jsonl.gz --latency recorded
+"""
+import gzip
+import json
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+MODES = ("record", "replay")
+
+# response fields that carry credentials, replaced before anything is written
+SECRET_FIELDS = ("access_token", "refresh_token", "id_token", "client_secret", "client_id")
+SCRUBBED = "scrubbed"
+# the only response headers kept; everything else is noise for the client
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+class CassetteMiss(requests.ConnectionError):
+    """A replayed request that was never recorded."""
+
+
+def _scrub(value):
+    if isinstance(value, dict):
+        return {key: SCRUBBED if key in SECRET_FIELDS else _scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_scrub(item) for item in value]
+    return value
+
+
+def requestKey(method: str, url: str) -> str:
+    """What a request is matched on: method, path and the sorted query, without host or headers."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.path}" + (f"?{query}" if query else "")
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay"):
+        """
+        path: cassette file, gzipped when it ends in .gz
+        mode: "record" appends new pairs to the file, "replay" serves them from it
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._entries = {}  # request key -> recorded responses, in the order they were recorded
+        self._next = {}  # request key -> index of the response to replay next
+        self._lock = threading.Lock()
+        self._file = None
+        if mode == "replay":
+            self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self):
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["request"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, elapsed: float):
+        key = requestKey(request.method, request.url)
+        try:
+            body = _scrub(response.json())
+        except ValueError:
+            body = response.text
+        entry = {
+            "request": key,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "body": body,
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                self._file = self._open("a")
+            self._file.write(line + "\n")
+            self._file.flush()  # a crash mid-run keeps everything recorded so far
+            self._entries.setdefault(key, []).append(entry)
+            self.recorded += 1
+
+    def lookup(self, request: requests.PreparedRequest) -> dict:
+        """
+        The recorded response for request. Repeated requests get the recorded responses in turn,
+        and the last one again once they run out.
+        """
+        key = requestKey(request.method, request.url)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"{key} is not in cassette {self.path} ({len(self._entries)} distinct requests recorded)",
+                                   request=request)
+            index = self._next.get(key, 0)
+            self._next[key] = index + 1
+            self.replayed += 1
+            return entries[min(index, len(entries) - 1)]
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "path": self.path, "requests": len(self._entries), "recorded": self.recorded,
+                "replayed": self.replayed, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    requests transport that records through to the network, or replays without it.
+    latency (replay only): extra seconds per response, or "recorded" to wait as long as the
+    original request took, scaled by latency_scale.
+    """
+
+    def __init__(self, cassette: Cassette, latency=0.0, latency_scale: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latency = latency
+        self.latency_scale = latency_scale
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == "record":
+            start = time.perf_counter()
+            response = super().send(request, **kwargs)
+            self.cassette.record(request, response, time.perf_counter() - start)
+            return response
+        entry = self.cassette.lookup(request)
+        delay = entry.get("elapsed", 0.0) * self.latency_scale if self.latency == "recorded" else float(self.latency or 0)
+        if delay > 0:
+            time.sleep(delay)
+        return self._response(request, entry)
+
+    @staticmethod
+    def _response(request, entry: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        body = entry["body"]
+        response._content = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        return response
@@ -0,0 +1,113 @@
+"""
+Conversation history for long-running chat loops.
+Messages are appended once (by message ID) and only the most recent ones are kept in memory; with
+a path, every message is also checkpointed to a SQLite file, so older turns live on disk and a
+session can be picked up again after a restart.
+
+    store = ConversationStore(path="conversations.sqlite", session_id="alice")
+    store.append([HumanMessage(content="Hi")])
+    result = graph.invoke({"messages": store.messages()})
+    store.append(result["messages"])  # messages already stored are skipped
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+# optional checkpoint file, e.g. CONVERSATION_PATH=conversations.sqlite
+CONVERSATION_PATH = os.getenv("CONVERSATION_PATH")
+
+
+class ConversationStore:
+    def __init__(self, path: str = None, session_id: str = "default", window: int = 40):
+        """
+        path: optional SQLite file the full history is written to; existing messages of the session are loaded
+        session_id: which conversation in the file this store reads and appends to
+        window: number of most recent messages held in memory
+        """
+        self.session_id = session_id
+        self.window = window
+        self._recent = OrderedDict()  # message id -> message, oldest first
+        self._count = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS messages "
+                             "(session_id TEXT, seq INTEGER, id TEXT, message TEXT, created REAL, "
+                             "PRIMARY KEY (session_id, id))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_seq ON messages (session_id, seq)")
+            self._db.commit()
+            self._resume()
+
+    def _resume(self):
+        self._count = self._db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?",
+                                       (self.session_id,)).fetchone()[0]
+        rows = self._db.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                                (self.session_id, self.window)).fetchall()
+        for message in messages_from_dict([json.loads(row[0]) for row in reversed(rows)]):
+            self._recent[message.id] = message
+
+    def _seen(self, message_id: str) -> bool:
+        if message_id in self._recent:
+            return True
+        if self._db is None:
+            return False
+        return self._db.execute("SELECT 1 FROM messages WHERE session_id = ? AND id = ?",
+                                (self.session_id, message_id)).fetchone() is not None
+
+    def append(self, messages: list) -> list:
+        """
+        Adds messages that aren't stored yet, giving an ID to any message without one.
+        Returns the messages that were new.
+        """
+        added = []
+        with self._lock:
+            for message in messages:
+                if message.id is None:
+                    message.id = str(uuid.uuid4())
+                elif self._seen(message.id):
+                    continue
+                self._recent[message.id] = message
+                if self._db is not None:
+                    self._db.execute("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?)",
+                                     (self.session_id, self._count, message.id,
+                                      json.dumps(message_to_dict(message)), time.time()))
+                self._count += 1
+                added.append(message)
+            while len(self._recent) > self.window:
+                self._recent.popitem(last=False)
+            if self._db is not None and added:
+                self._db.commit()
+        return added
+
+    def messages(self) -> list:
+        """The in-memory window, oldest first."""
+        with self._lock:
+            return list(self._recent.values())
+
+    def history(self, limit: int = None) -> list:
+        """All stored messages of the session (or the last limit of them), read from the checkpoint."""
+        if self._db is None:
+            return self.messages()[-limit:] if limit else self.messages()
+        with self._lock:
+            rows = self._db.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                                    (self.session_id, -1 if limit is None else limit)).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def __len__(self):
+        """Number of messages in the whole session, not just the in-memory window."""
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._count = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+                self._db.commit()
@@ -0,0 +1,129 @@
+"""
+Deterministic stand-ins for the models, so graphs can be run and timed without a GPU model or
+an OpenAI key. ScriptedGPT4All replaces gpt4all.GPT4All (scriptedModel builds it in ModelPool
+workers); FakeToolChatModel replaces the
+ChatOpenAI node, asking for hotel searches whenever the user gives coordinates.
+"""
+import asyncio
+import re
+import time
+import zlib
+from contextlib import contextmanager
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from Streaming import estimateTokens
+
+DEFAULT_REPLIES = [
+    "Paris has plenty of hotels, from budget rooms near the stations to luxury places by the Seine.",
+    "For a quiet stay in Tokyo, look at the hotels in the western part of Shinjuku.",
+    "I would pick the family-friendly hotel with the pool, it is close to the park and the metro.",
+    "Most hotels in New York charge a city tax on top of the room rate, so check the final price.",
+]
+
+_TOKEN = re.compile(r"\s*\S+")
+_COORDS = re.compile(r"(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)")
+
+
+class ScriptedGPT4All:
+    """
+    Stands in for gpt4all.GPT4All. generate() streams one of the scripted replies (picked by a
+    hash of the prompt, so the same prompt always gets the same reply) a word at a time, with
+    optional delays for prompt processing and for each token.
+    """
+
+    def __init__(self, replies: list = None, seconds_per_prompt_char: float = 0.0, seconds_per_token: float = 0.0):
+        self.replies = replies or DEFAULT_REPLIES
+        self.seconds_per_prompt_char = seconds_per_prompt_char
+        self.seconds_per_token = seconds_per_token
+        self.calls = 0
+        self.prompt_chars = 0
+
+    @contextmanager
+    def chat_session(self, system_prompt: str = None, prompt_template: str = None):
+        yield self
+
+    def generate(self, prompt: str, max_tokens: int = 200, callback=None, streaming: bool = False, **kwargs) -> str:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        if self.seconds_per_prompt_char:
+            time.sleep(len(prompt) * self.seconds_per_prompt_char)
+        reply = self.replies[zlib.crc32(prompt.encode()) % len(self.replies)]
+        parts = []
+        # like a real tokenizer, every word comes with its leading space
+        for token_id, token in enumerate(_TOKEN.findall(" " + reply)[:max_tokens]):
+            if self.seconds_per_token:
+                time.sleep(self.seconds_per_token)
+            parts.append(token)
+            if callback is not None and callback(token_id, token) is False:
+                break
+        return "".join(parts)
+
+    def close(self):
+        pass
+
+
+def scriptedModel(model_name: str = None, device: str = None, n_threads: int = None,
+                  seconds_per_prompt_char: float = 0.0, seconds_per_token: float = 0.0) -> ScriptedGPT4All:
+    """
+    Builds a ScriptedGPT4All with GPT4All's constructor arguments, as ModelPool's model_factory
+    (bind the delays with functools.partial).
+    """
+    return ScriptedGPT4All(seconds_per_prompt_char=seconds_per_prompt_char, seconds_per_token=seconds_per_token)
+
+
+class FakeToolChatModel(BaseChatModel):
+    """
+    Scripted tool-calling chat model. A user message with "lat, lon" pairs gets a
+    FindHotelsByCoords call (FindHotelsNearLocations for several pairs); once the tool results
+    are in, or if there were no coordinates, it answers in plain text.
+    """
+    latency: float = 0.0  # seconds per call, standing in for the network and the model
+    radius: int = 1
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages: list) -> AIMessage:
+        message = self._reply(messages)
+        # token counts like the ones ChatOpenAI reports, for the tracing metrics
+        input_tokens = sum(estimateTokens(str(m.content)) for m in messages)
+        output_tokens = estimateTokens(message.content) + 10 * len(message.tool_calls)
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                  "total_tokens": input_tokens + output_tokens}
+        return message
+
+    def _reply(self, messages: list) -> AIMessage:
+        self.calls += 1
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            results = [message for message in messages if isinstance(message, ToolMessage)]
+            lines = sum(message.content.count("\n") + 1 for message in results)
+            return AIMessage(content=f"Here is what I found: {lines} lines of hotel results.")
+        if isinstance(last, HumanMessage):
+            coords = [[float(lat), float(lon)] for lat, lon in _COORDS.findall(last.content)]
+            call_id = f"call_{self.calls}"
+            if len(coords) == 1:
+                return AIMessage(content="", tool_calls=[{"name": "FindHotelsByCoords", "id": call_id,
+                                                          "args": {"coords": coords[0], "radius": self.radius}}])
+            if coords:
+                return AIMessage(content="", tool_calls=[{"name": "FindHotelsNearLocations", "id": call_id,
+                                                          "args": {"coords_list": coords, "radius": self.radius}}])
+        return AIMessage(content="I can look up hotels if you give me coordinates.")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
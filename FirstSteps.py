@@ -1,12 +1,16 @@
-from gpt4all import GPT4All
+from ModelRegistry import getModel
 
-model = GPT4All(
+model = getModel(
     "Meta-Llama-3-8B-Instruct.Q4_0.gguf",
     device="gpu"
 )
 
-with model.chat_session():
-    output = model.generate("what are the top 3 things to do in paris?", max_tokens=128)
-    print(output)
-    output = model.generate(f"explain why these three are the top things to do in paris? {output}")
-    print(output)
\ No newline at end of file
+def main():
+    with model.chat_session():
+        output = model.generate("what are the top 3 things to do in paris?", max_tokens=128)
+        print(output)
+        output = model.generate(f"explain why these three are the top things to do in paris? {output}")
+        print(output)
+
+if __name__ == "__main__":
+    main()
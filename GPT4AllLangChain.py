@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from langchain.llms.base import LLM
+from pydantic import PrivateAttr
+from langchain.schema import Generation, LLMResult
+
+from ModelPool import ModelPool
+from LLMCache import LangChainLLMCache
+from ModelRegistry import LazyModel, getModel, getPromptSession
+from Streaming import StopSequenceMatcher
+from Tracing import tracer
+
+
+class GPT4AllLangChain(LLM):
+    """
+    LangChain LLM around a local GPT4All model.
+    Tokens are checked against the stop sequences while they are generated, so generation ends
+    as soon as e.g. a ReAct "Observation:" appears instead of running to max_tokens.
+    With reuse_session=True the chat session is kept open between calls and only the part of a
+    prompt the model hasn't processed yet is fed to it (see PromptSession), which suits ReAct
+    loops where every prompt extends the previous one. Pass conversation_id=... to invoke()
+    to keep separate conversations apart. Every wrapper on the same model shares its session.
+    Pass cache=getCache().asLangChainCache() (see LLMCache) to answer repeated prompts from the cache;
+    it only keeps answers sampled at temp <= 0.5.
+    Given a ModelPool, prompts are instead sent to the pool's worker processes, so a batch of
+    prompts (or several conversations) is generated in parallel and no model is loaded here.
+    """
+    _model: LazyModel = PrivateAttr(default=None)
+    _pool: ModelPool = PrivateAttr(default=None)
+    _model_path: str = PrivateAttr(default=None)
+    max_tokens: int = 200  # Shorter responses
+    temp: float = 0.7  # GPT4All's defaults; LLMCache only keeps answers sampled at temp <= 0.5
+    top_p: float = 0.4
+    reuse_session: bool = False
+
+    def __init__(self, model_path, device="gpu", pool: ModelPool = None, **kwargs):
+        super().__init__(**kwargs)
+        self._model_path = model_path
+        if isinstance(self.cache, LangChainLLMCache):
+            # whether an answer may be cached depends on this wrapper's temp, not on the llm_string
+            self.cache = self.cache.forModel(lambda: self._identifying_params)
+        if pool is not None:
+            self._pool = pool
+            return
+        # shared with every other wrapper in the process, and only loaded on first use
+        self._model = getModel(model_path, device=device)
+
+    @property
+    def _llm_type(self):
+        return "gpt4all"
+
+    @property
+    def _identifying_params(self):
+        # also what LangChain's cache keys on, next to the prompt
+        return {"model": self._model_path, **self._sampling()}
+
+    def _call(self, prompt: str, stop=None, run_manager=None, **kwargs):
+        matcher = StopSequenceMatcher(stop)
+        parts = []
+        tokens = 0
+
+        def callback(token_id, token):
+            nonlocal tokens
+            tokens += 1
+            text = matcher.feed(token)
+            if text:
+                parts.append(text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+            return not matcher.stopped  # returning False ends generation
+
+        with tracer.span("gpt4all", "llm", prompt_chars=len(prompt)):
+            start = time.perf_counter()
+            # looked up on every call: the model may have been unloaded and loaded again since
+            session = getPromptSession(self._model)
+            if self.reuse_session:
+                session.generate(prompt, conversation_id=kwargs.get("conversation_id", "default"),
+                                 callback=callback, **self._sampling())
+            else:
+                with session.exclusive() as model, model.chat_session():
+                    model.generate(prompt, callback=callback, **self._sampling())
+            tracer.llmTokens("gpt4all", tokens, time.perf_counter() - start)
+
+        if not matcher.stopped:
+            parts.append(matcher.flush())
+        return "".join(parts)
+
+    def _sampling(self) -> dict:
+        return {"max_tokens": self.max_tokens, "temp": self.temp, "top_p": self.top_p}
+
+    def _submit(self, prompts, stop, kwargs) -> list:
+        conversation_id = kwargs.get("conversation_id", "default")
+        return [self._pool.submit(prompt, conversation_id=conversation_id, stop=stop, **self._sampling())
+                for prompt in prompts]
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
+        if self._pool is not None:
+            futures = self._submit(prompts, stop, kwargs)
+            try:
+                return LLMResult(generations=[[Generation(text=future.result())] for future in futures])
+            except BaseException:
+                for future in futures:
+                    self._pool.cancel(future)
+                raise
+        generations = []
+        for prompt in prompts:
+            text = self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+            generations.append([Generation(text=text)])
+        return LLMResult(generations=generations)
+
+    async def _agenerate(self, prompts, stop=None, run_manager=None, **kwargs):
+        if self._pool is None:
+            return await super()._agenerate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+        futures = self._submit(prompts, stop, kwargs)
+        try:
+            texts = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        except BaseException:
+            for future in futures:
+                self._pool.cancel(future)
+            raise
+        return LLMResult(generations=[[Generation(text=text)] for text in texts])
@@ -0,0 +1,117 @@
+"""
+Response cache for hotel searches.
+Coordinates are snapped to a grid so that nearby queries for the same neighbourhood share an
+entry. Entries live in an in-memory LRU and, optionally, in a SQLite file that survives restarts.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class HotelCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, cell_size: float = 0.001, path: str = None):
+        """
+        max_entries: size of the in-memory LRU tier
+        ttl: seconds an entry stays valid
+        cell_size: grid size in degrees that coordinates are snapped to (0.001 is roughly 100m)
+        path: optional SQLite file for the on-disk tier
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cell_size = cell_size
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value BLOB)")
+            self._db.commit()
+
+    def key(self, latitude: float, longitude: float, radius: float) -> str:
+        lat_cell = round(latitude / self.cell_size)
+        lon_cell = round(longitude / self.cell_size)
+        return f"{lat_cell}:{lon_cell}:{radius:g}"
+
+    def get(self, latitude: float, longitude: float, radius: float):
+        """Returns the cached value, or None on a miss or an expired entry."""
+        key = self.key(latitude, longitude, radius)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                # expired entries stay until evicted, for getStale() to fall back on
+            if self._db is not None:
+                row = self._db.execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    value = pickle.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def getStale(self, latitude: float, longitude: float, radius: float):
+        """The entry for these coordinates even if it has expired, or None; for when the API is down."""
+        key = self.key(latitude, longitude, radius)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return entry[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    return pickle.loads(row[0])
+        return None
+
+    def put(self, latitude: float, longitude: float, radius: float, value):
+        key = self.key(latitude, longitude, radius)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                                 (key, expires, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+                self._db.commit()
+
+    def _remember(self, key: str, expires: float, value):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purgeExpired(self):
+        """Drops expired entries from both tiers."""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expires, _) in self._memory.items() if expires <= now]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._memory),
+        }
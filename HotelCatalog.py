@@ -0,0 +1,414 @@
+"""
+Hotel catalog shared by the travel bots.
+Hotels live in a SQLite table indexed by normalised city and hotel name, so lookups stay indexed
+however large the catalog gets and nothing is held in Python dicts. City names are matched
+ignoring case, accents and punctuation, through aliases ("NYC" -> New York) and, failing that,
+by fuzzy matching against the known cities, which also copes with free text like "hotels in paris".
+
+Catalogs are bulk loaded from CSV or JSONL files (including raw Amadeus by-geocode entries) or
+from a HotelCache file of earlier Amadeus searches:
+
+    python HotelCatalog.py --catalog catalog.sqlite load testLocations.csv hotels.jsonl
+    python HotelCatalog.py --catalog catalog.sqlite find "new york"
+"""
+import argparse
+import csv
+import difflib
+import functools
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import unicodedata
+from itertools import islice
+
+from HotelRecords import Hotel
+
+# optional catalog file, e.g. HOTEL_CATALOG_PATH=catalog.sqlite; without one the demo catalog is kept in memory
+CATALOG_PATH = os.getenv("HOTEL_CATALOG_PATH")
+
+LOAD_BATCH_SIZE = 10000
+FUZZY_CUTOFF = 0.8
+
+DEFAULT_ALIASES = {
+    "nyc": "New York",
+    "ny": "New York",
+    "new york city": "New York",
+    "big apple": "New York",
+    "la": "Los Angeles",
+    "sf": "San Francisco",
+    "paname": "Paris",
+    "ville lumiere": "Paris",
+    "tokio": "Tokyo",
+    "london uk": "London",
+}
+
+# the sample hotels the bots were written against
+DEMO_HOTELS = [
+    ("Hotel A", "Paris", "A budget-friendly hotel with basic amenities."),
+    ("Hotel B", "Paris", "A mid-range hotel with comfortable rooms and free breakfast."),
+    ("Hotel C", "Paris", "A luxury hotel with a spa and fine dining."),
+    ("Hotel D", "New York", "A budget hotel located in the heart of the city."),
+    ("Hotel E", "New York", "A boutique hotel with unique decor and personalized service."),
+    ("Hotel F", "New York", "A family-friendly hotel with a pool and play area."),
+    ("Hotel G", "Tokyo", "A modern hotel with stunning views of the city skyline."),
+    ("Hotel H", "Tokyo", "An eco-friendly hotel with sustainable practices."),
+    ("Hotel I", "Tokyo", "A traditional hotel with a rich history."),
+]
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+# column names accepted in CSV headers and JSONL objects
+_FIELDS = {
+    "name": "name", "hotel": "name", "hotel_name": "name",
+    "city": "city", "cityname": "city", "city_name": "city",
+    "country": "country", "countrycode": "country", "country_code": "country",
+    "address": "address",
+    "description": "description",
+    "hotelid": "hotel_id", "hotel_id": "hotel_id", "id": "hotel_id",
+    "latitude": "latitude", "lat": "latitude",
+    "longitude": "longitude", "lon": "longitude", "lng": "longitude",
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accents and punctuation removed, single spaces: "  São-Paulo " -> "sao paulo"."""
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+@functools.lru_cache(maxsize=65536)
+def _cityKey(city: str) -> str:
+    # a bulk load repeats the same few thousand city names over and over
+    return normalize(city)
+
+
+def _cityFromAddress(address: str) -> str:
+    """City part of an address ending in "..., City, CC" (the layout of testLocations.csv)."""
+    parts = [part.strip() for part in address.split(",") if part.strip()]
+    if len(parts) >= 2 and len(parts[-1]) == 2:
+        return parts[-2]
+    return parts[-1] if parts else ""
+
+
+def _toFloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class HotelCatalog:
+    def __init__(self, path: str = None, aliases: dict = None):
+        """
+        path: SQLite file holding the catalog, in memory when not given
+        aliases: extra city aliases on top of DEFAULT_ALIASES, alias -> city
+        """
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._lock = threading.RLock()
+        self._city_keys = None  # known cities for fuzzy matching, read on first need
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS hotels (
+                name TEXT, name_key TEXT, city TEXT, city_key TEXT, country TEXT, address TEXT,
+                description TEXT, hotel_id TEXT, latitude REAL, longitude REAL,
+                updated INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (city_key, name_key));
+            CREATE INDEX IF NOT EXISTS hotels_name ON hotels (name_key);
+            CREATE INDEX IF NOT EXISTS hotels_hotel_id ON hotels (hotel_id);
+            CREATE TABLE IF NOT EXISTS cities (city_key TEXT PRIMARY KEY, city TEXT);
+            CREATE TABLE IF NOT EXISTS aliases (alias_key TEXT PRIMARY KEY, city_key TEXT);
+        """)
+        # catalogs written before descriptions were versioned
+        if "updated" not in [row[1] for row in self._db.execute("PRAGMA table_info(hotels)")]:
+            self._db.execute("ALTER TABLE hotels ADD COLUMN updated INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS hotels_updated ON hotels (updated)")
+        self._db.commit()
+        for alias, city in {**DEFAULT_ALIASES, **(aliases or {})}.items():
+            self.addAlias(alias, city)
+
+    # --- loading ---
+
+    def addAlias(self, alias: str, city: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (normalize(alias), normalize(city)))
+            self._db.commit()
+
+    def addHotel(self, name: str, city: str, description: str = None, **fields) -> int:
+        return self.addHotels([dict(fields, name=name, city=city, description=description)])
+
+    def addHotels(self, records) -> int:
+        """
+        Bulk inserts hotels given as dicts (name, city and optionally country, address, description,
+        hotel_id, latitude, longitude) or Hotel records. A hotel already in the catalog under the same
+        name and city is updated, keeping fields the new record leaves empty. Returns the rows written.
+        Each batch gets the next version number, stored on new hotels and on hotels whose
+        description changed, so indexes over the descriptions can pick up just those (see describedSince).
+        """
+        records = iter(records)
+        written = 0
+        while True:
+            batch = [row for row in map(self._row, islice(records, LOAD_BATCH_SIZE)) if row is not None]
+            if not batch:
+                break
+            with self._lock:
+                version = self._db.execute("SELECT COALESCE(MAX(updated), 0) + 1 FROM hotels").fetchone()[0]
+                self._db.executemany("""
+                    INSERT INTO hotels VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (city_key, name_key) DO UPDATE SET
+                        updated = CASE WHEN excluded.description IS NOT NULL AND excluded.description IS NOT description
+                                       THEN excluded.updated ELSE updated END,
+                        country = COALESCE(excluded.country, country),
+                        address = COALESCE(excluded.address, address),
+                        description = COALESCE(excluded.description, description),
+                        hotel_id = COALESCE(excluded.hotel_id, hotel_id),
+                        latitude = COALESCE(excluded.latitude, latitude),
+                        longitude = COALESCE(excluded.longitude, longitude)
+                """, [row + (version,) for row in batch])
+                cities = {row[3]: row[2] for row in batch}
+                self._db.executemany("INSERT OR IGNORE INTO cities VALUES (?, ?)", cities.items())
+                self._db.commit()
+                self._city_keys = None
+            written += len(batch)
+        return written
+
+    @staticmethod
+    def _row(record):
+        if isinstance(record, Hotel):
+            record = {"name": record.name, "city": record.city, "country": record.country,
+                      "address": ", ".join(record.addressLines), "hotel_id": record.hotelId,
+                      "latitude": record.latitude, "longitude": record.longitude}
+        name = (record.get("name") or "").strip()
+        city = (record.get("city") or "").strip() or _cityFromAddress(record.get("address") or "")
+        city_key = _cityKey(city)
+        if not name or not city_key:
+            return None
+        return (name, normalize(name), city, city_key, record.get("country") or None,
+                record.get("address") or None, record.get("description") or None, record.get("hotel_id") or None,
+                _toFloat(record.get("latitude")), _toFloat(record.get("longitude")))
+
+    def loadCsv(self, path: str) -> int:
+        """
+        Loads a CSV file with a header row naming its columns (Name, City, Address, Description, ...).
+        Rows with more fields than the header, as when an address with commas isn't quoted,
+        have the extra fields joined back into the last column.
+        """
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [_FIELDS.get(normalize(column).replace(" ", "_"), normalize(column)) for column in next(reader, [])]
+
+            def records():
+                for row in reader:
+                    if len(row) > len(header):
+                        row = row[:len(header) - 1] + [",".join(row[len(header) - 1:])]
+                    yield dict(zip(header, row))
+
+            return self.addHotels(records())
+
+    def loadJsonl(self, path: str) -> int:
+        """Loads one hotel per line: either catalog fields or an Amadeus by-geocode entry."""
+        def records():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if "address" in record and isinstance(record["address"], dict):
+                        yield Hotel.fromJson(record)
+                    else:
+                        yield {_FIELDS.get(normalize(key).replace(" ", "_"), key): value for key, value in record.items()}
+
+        return self.addHotels(records())
+
+    def loadHotelCache(self, path: str) -> int:
+        """Loads every hotel found by earlier Amadeus searches stored in a HotelCache SQLite file."""
+        source = sqlite3.connect(path)
+        try:
+            def records():
+                for (value,) in source.execute("SELECT value FROM cache"):
+                    yield from pickle.loads(value)
+
+            return self.addHotels(records())
+        finally:
+            source.close()
+
+    def load(self, path: str) -> int:
+        """Loads a .csv, .jsonl or HotelCache .sqlite file, chosen by extension."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            return self.loadCsv(path)
+        if extension in (".jsonl", ".json"):
+            return self.loadJsonl(path)
+        if extension in (".sqlite", ".db"):
+            return self.loadHotelCache(path)
+        raise ValueError(f"Don't know how to load {path}")
+
+    # --- lookups ---
+
+    def resolveCity(self, text: str):
+        """
+        The catalog's name for the city meant by text, or None. Tries the exact (normalised) name,
+        aliases, the words after a final " in ", and then a fuzzy match against the known cities.
+        """
+        key = normalize(text)
+        if not key:
+            return None
+        candidates = [key]
+        if " in " in f" {key} ":
+            candidates.append(f" {key} ".rsplit(" in ", 1)[1].strip())
+        with self._lock:
+            for candidate in candidates:
+                row = self._db.execute(
+                    "SELECT city FROM cities WHERE city_key = COALESCE("
+                    "(SELECT city_key FROM aliases WHERE alias_key = ?), ?)", (candidate, candidate)).fetchone()
+                if row is not None:
+                    return row[0]
+            if self._city_keys is None:
+                self._city_keys = [row[0] for row in self._db.execute("SELECT city_key FROM cities")]
+            for candidate in candidates:
+                match = difflib.get_close_matches(candidate, self._city_keys, n=1, cutoff=FUZZY_CUTOFF)
+                if match:
+                    return self._db.execute("SELECT city FROM cities WHERE city_key = ?", match).fetchone()[0]
+        return None
+
+    def hotelsIn(self, city: str, limit: int = None) -> list:
+        """Names of the hotels in city (matched as in resolveCity), an empty list if the city is unknown."""
+        resolved = self.resolveCity(city)
+        if resolved is None:
+            return []
+        with self._lock:
+            rows = self._db.execute("SELECT name FROM hotels WHERE city_key = ? ORDER BY rowid LIMIT ?",
+                                    (normalize(resolved), -1 if limit is None else limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def describe(self, name: str):
+        """Description of the hotel with this name or hotel ID, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT description FROM hotels WHERE name_key = ? AND description IS NOT NULL LIMIT 1",
+                                   (normalize(name),)).fetchone()
+            if row is None:
+                row = self._db.execute("SELECT description FROM hotels WHERE hotel_id = ? LIMIT 1",
+                                       (name.strip(),)).fetchone()
+        return row[0] if row is not None else None
+
+    def describeMany(self, names: list) -> dict:
+        """name -> description (None if unknown) for many hotels, looked up in one query."""
+        keys = {name: normalize(name) for name in names}
+        found = {}
+        with self._lock:
+            unique = list(set(keys.values()))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                query = ("SELECT name_key, description FROM hotels WHERE description IS NOT NULL AND name_key IN (%s)"
+                         % ",".join("?" * len(chunk)))
+                for name_key, description in self._db.execute(query, chunk):
+                    found.setdefault(name_key, description)
+        return {name: found.get(key) or self.describe(name) for name, key in keys.items()}
+
+    def describeCity(self, city: str, limit: int = None) -> dict:
+        """name -> description for every hotel in city."""
+        resolved = self.resolveCity(city)
+        if resolved is None:
+            return {}
+        with self._lock:
+            rows = self._db.execute("SELECT name, description FROM hotels WHERE city_key = ? ORDER BY rowid LIMIT ?",
+                                    (normalize(resolved), -1 if limit is None else limit)).fetchall()
+        return dict(rows)
+
+    def hotelsInMany(self, cities: list, limit: int = None) -> dict:
+        """city as asked -> hotel names, for several cities at once."""
+        return {city: self.hotelsIn(city, limit) for city in cities}
+
+    # --- row access for indexes built on top of the catalog (see HotelSearch) ---
+
+    def describedSince(self, version: int, rowid: int = 0, limit: int = LOAD_BATCH_SIZE) -> list:
+        """
+        (rowid, description, version) of up to limit described hotels added or given a new
+        description after (version, rowid), in that order, so the last row is where to continue from.
+        """
+        with self._lock:
+            return self._db.execute("SELECT rowid, description, updated FROM hotels WHERE (updated, rowid) > (?, ?) "
+                                    "AND description IS NOT NULL ORDER BY updated, rowid LIMIT ?",
+                                    (version, rowid, limit)).fetchall()
+
+    def rowidsIn(self, city: str) -> list:
+        resolved = self.resolveCity(city)
+        if resolved is None:
+            return []
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT rowid FROM hotels WHERE city_key = ?", (normalize(resolved),))]
+
+    def hotelsByRowid(self, rowids: list) -> dict:
+        """rowid -> dict with name, city, country, description and hotel_id."""
+        rows = {}
+        with self._lock:
+            for start in range(0, len(rowids), 500):
+                chunk = [int(rowid) for rowid in rowids[start:start + 500]]
+                query = ("SELECT rowid, name, city, country, description, hotel_id FROM hotels WHERE rowid IN (%s)"
+                         % ",".join("?" * len(chunk)))
+                for rowid, name, city, country, description, hotel_id in self._db.execute(query, chunk):
+                    rows[rowid] = {"name": name, "city": city, "country": country,
+                                   "description": description, "hotel_id": hotel_id}
+        return rows
+
+    def cities(self) -> list:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT city FROM cities ORDER BY city")]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hotels").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            cities = self._db.execute("SELECT COUNT(*) FROM cities").fetchone()[0]
+        return {"hotels": len(self), "cities": cities}
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def getCatalog() -> HotelCatalog:
+    """The process-wide catalog (HOTEL_CATALOG_PATH if set), holding the demo hotels when it starts out empty."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog = HotelCatalog(CATALOG_PATH)
+                if not len(catalog):
+                    catalog.addHotels({"name": name, "city": city, "description": description}
+                                      for name, city, description in DEMO_HOTELS)
+                _catalog = catalog
+    return _catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and query the hotel catalog")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="SQLite catalog file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="bulk load .csv, .jsonl or HotelCache .sqlite files")
+    load.add_argument("files", nargs="+")
+    find = commands.add_parser("find", help="list the hotels in a city")
+    find.add_argument("city")
+    describe = commands.add_parser("describe", help="describe a hotel by name or ID")
+    describe.add_argument("name")
+    args = parser.parse_args()
+
+    catalog = HotelCatalog(args.catalog)
+    if args.command == "load":
+        for path in args.files:
+            print(f"{path}: {catalog.load(path)} hotels")
+        print(catalog.stats())
+    elif args.command == "find":
+        city = catalog.resolveCity(args.city)
+        print(f"{city}: {', '.join(catalog.hotelsIn(city))}" if city else "No hotels found.")
+    else:
+        print(catalog.describe(args.name) or "No description available for this hotel.")
+
+if __name__ == "__main__":
+    main()
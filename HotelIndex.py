@@ -0,0 +1,129 @@
+"""
+Local spatial index of hotels returned by the by-geocode endpoint.
+Every response is added together with the circle it covered. A later query whose circle lies
+entirely inside an area we already fetched is answered locally with a vectorized haversine
+filter instead of another API call. Areas older than the ttl are dropped as new responses come
+in, together with the hotels no remaining area covers, so a long-running bot's index stays the
+size of what it has searched recently.
+"""
+import threading
+import time
+
+import numpy as np
+
+from HotelRecords import HotelList
+
+EARTH_RADIUS_KM = 6371.0
+# slack for hotels the API places right on the edge of the searched circle
+EDGE_TOLERANCE_KM = 0.05
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works element-wise on NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class HotelIndex:
+    def __init__(self, ttl: float = 24 * 3600.0, capacity: int = 1024):
+        """
+        ttl: seconds a fetched area counts as covered
+        capacity: initial size of the coordinate and area arrays (they grow by doubling)
+        """
+        self.ttl = ttl
+        self.local_hits = 0
+        self.misses = 0
+        self._coords = np.empty((capacity, 2), dtype=np.float64)  # latitude, longitude per row
+        self._hotels = []  # row -> Hotel
+        self._rows = {}  # hotelId -> row
+        self._areas = np.empty((capacity, 4), dtype=np.float64)  # latitude, longitude, radius, fetched_at
+        self._area_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hotels)
+
+    def add(self, latitude: float, longitude: float, radius: float, hotels: list):
+        """Adds the Hotel records of one by-geocode response and marks its circle as covered."""
+        with self._lock:
+            self._prune()
+            for hotel in hotels:
+                if hotel.latitude is None or hotel.longitude is None:
+                    continue
+                row = self._rows.get(hotel.hotelId)
+                if row is None:
+                    row = len(self._hotels)
+                    if row == len(self._coords):
+                        self._coords = np.resize(self._coords, (row * 2, 2))
+                    self._hotels.append(hotel)
+                    self._rows[hotel.hotelId] = row
+                else:
+                    self._hotels[row] = hotel
+                self._coords[row] = (hotel.latitude, hotel.longitude)
+            if self._area_count == len(self._areas):
+                self._areas = np.resize(self._areas, (self._area_count * 2, 4))
+            self._areas[self._area_count] = (latitude, longitude, radius, time.time())
+            self._area_count += 1
+
+    def _prune(self):
+        """Drops expired areas and then the hotels that no remaining area covers."""
+        areas = self._areas[:self._area_count]
+        fresh = areas[:, 3] > time.time() - self.ttl
+        if fresh.all():
+            return
+        areas = areas[fresh]
+        self._area_count = len(areas)
+        self._areas[:self._area_count] = areas
+        count = len(self._hotels)
+        coords = self._coords[:count]
+        covered = np.zeros(count, dtype=bool)
+        for area_latitude, area_longitude, area_radius, _ in areas:
+            covered |= haversine(area_latitude, area_longitude, coords[:, 0], coords[:, 1]) <= area_radius + EDGE_TOLERANCE_KM
+        if covered.all():
+            return
+        keep = np.flatnonzero(covered)
+        self._coords[:len(keep)] = coords[keep]
+        self._hotels = [self._hotels[row] for row in keep]
+        self._rows = {hotel.hotelId: row for row, hotel in enumerate(self._hotels)}
+
+    def covers(self, latitude: float, longitude: float, radius: float) -> bool:
+        """True if the circle lies entirely inside an area fetched less than ttl seconds ago."""
+        with self._lock:
+            return self._covers(latitude, longitude, radius)
+
+    def _covers(self, latitude: float, longitude: float, radius: float) -> bool:
+        # expired areas are only skipped here; add() removes them along with their hotels
+        areas = self._areas[:self._area_count]
+        areas = areas[areas[:, 3] > time.time() - self.ttl]
+        if not len(areas):
+            return False
+        distance = haversine(latitude, longitude, areas[:, 0], areas[:, 1])
+        return bool(np.any(distance + radius <= areas[:, 2]))
+
+    def query(self, latitude: float, longitude: float, radius: float):
+        """
+        Returns the indexed hotels inside the circle as a HotelList sorted by distance,
+        or None if the circle isn't covered by earlier searches.
+        """
+        with self._lock:
+            if not self._covers(latitude, longitude, radius):
+                self.misses += 1
+                return None
+            self.local_hits += 1
+            count = len(self._hotels)
+            coords = self._coords[:count]
+            # cheap bounding-box pass before the trig
+            lat_span = radius / 111.0
+            lon_span = radius / (111.0 * max(np.cos(np.radians(latitude)), 0.01))
+            candidates = np.flatnonzero(
+                (np.abs(coords[:, 0] - latitude) <= lat_span) & (np.abs(coords[:, 1] - longitude) <= lon_span)
+            )
+            distance = haversine(latitude, longitude, coords[candidates, 0], coords[candidates, 1])
+            inside = distance <= radius
+            rows, distance = candidates[inside], distance[inside]
+            order = np.argsort(distance, kind="stable")
+            return HotelList(self._hotels[rows[i]].withDistance(round(float(distance[i]), 2)) for i in order)
+
+    def stats(self) -> dict:
+        return {"hotels": len(self._hotels), "areas": self._area_count, "local_hits": self.local_hits, "misses": self.misses}
@@ -0,0 +1,111 @@
+"""
+Typed records for Amadeus hotel and rating data.
+Responses are parsed once into these; the text shown to the LLM is rendered only when asked for,
+so caching, indexing and ranking work on the records directly.
+"""
+
+
+class Hotel:
+    __slots__ = ("hotelId", "name", "addressLines", "city", "country", "latitude", "longitude", "distance")
+
+    def __init__(self, hotelId: str, name: str, addressLines: tuple = (), city: str = "", country: str = "",
+                 latitude: float = None, longitude: float = None, distance: float = None):
+        self.hotelId = hotelId
+        self.name = name
+        self.addressLines = addressLines
+        self.city = city
+        self.country = country
+        self.latitude = latitude
+        self.longitude = longitude
+        self.distance = distance  # km from the search centre
+
+    @classmethod
+    def fromJson(cls, hotel: dict) -> "Hotel":
+        """Builds a Hotel from one entry of a by-geocode response."""
+        address = hotel.get("address", {})
+        geo = hotel.get("geoCode", {})
+        return cls(
+            hotelId=hotel.get("hotelId", "Unknown"),
+            name=hotel.get("name", "Unknown"),
+            addressLines=tuple(address.get("lines", [])),
+            city=address.get("cityName", ""),
+            country=address.get("countryCode", ""),
+            latitude=geo.get("latitude"),
+            longitude=geo.get("longitude"),
+            distance=hotel.get("distance", {}).get("value"),
+        )
+
+    def withDistance(self, distance: float) -> "Hotel":
+        return Hotel(self.hotelId, self.name, self.addressLines, self.city, self.country,
+                     self.latitude, self.longitude, distance)
+
+    def render(self) -> str:
+        return f"ID:{self.hotelId} - {self.name} - {', '.join(self.addressLines)} - {self.city}, {self.country}"
+
+    def __repr__(self):
+        return f"Hotel({self.hotelId!r}, {self.name!r})"
+
+
+class HotelList(list):
+    """A list of Hotel records. str() renders the listing given to the LLM."""
+
+    @classmethod
+    def fromJson(cls, response: dict) -> "HotelList":
+        return cls(Hotel.fromJson(hotel) for hotel in response.get("data", []))
+
+    def render(self) -> str:
+        return "".join([hotel.render() + "\n" for hotel in self])
+
+    def __str__(self):
+        return self.render()
+
+
+class Rating:
+    __slots__ = ("hotelId", "overallRating", "numberOfReviews", "numberOfRatings", "sentiments")
+
+    def __init__(self, hotelId: str, overallRating=None, numberOfReviews=None, numberOfRatings=None, sentiments: dict = None):
+        self.hotelId = hotelId
+        self.overallRating = overallRating
+        self.numberOfReviews = numberOfReviews
+        self.numberOfRatings = numberOfRatings
+        self.sentiments = sentiments  # None when Amadeus has no rating data for the hotel
+
+    @classmethod
+    def fromJson(cls, hotel: dict) -> "Rating":
+        """Builds a Rating from one entry of a hotel-sentiments response."""
+        return cls(
+            hotelId=hotel.get("hotelId", "Unknown"),
+            overallRating=hotel.get("overallRating", "Unknown"),
+            numberOfReviews=hotel.get("numberOfReviews", "Unknown"),
+            numberOfRatings=hotel.get("numberOfRatings", "Unknown"),
+            sentiments=hotel.get("sentiments", {}),
+        )
+
+    @classmethod
+    def missing(cls, hotelId: str) -> "Rating":
+        """The explicit "no data" entry for a hotel without ratings."""
+        return cls(hotelId)
+
+    @property
+    def available(self) -> bool:
+        return self.sentiments is not None
+
+    def render(self) -> str:
+        if not self.available:
+            return f"No rating information found for hotel ID: {self.hotelId}"
+        lines = [
+            f"Hotel ID: {self.hotelId}",
+            f"Overall Rating: {self.overallRating}/100",
+            f"Number of Reviews: {self.numberOfReviews}",
+            f"Number of Ratings: {self.numberOfRatings}",
+            "",
+            "Sentiment Scores:",
+        ]
+        lines.extend(f"  - {key}: {value}/100" for key, value in self.sentiments.items())
+        return "\n".join(lines) + "\n"
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return f"Rating({self.hotelId!r}, {self.overallRating!r})"
@@ -0,0 +1,259 @@
+"""
+Semantic search over the hotel descriptions in the catalog.
+Every described hotel is embedded once into a row of a float32 matrix (memory-mapped from a .npy
+file when a path is given, so it is shared with the page cache and survives restarts). A query is
+one matrix-vector product over the unit-length rows, optionally restricted to one city, and the
+top k scores are picked with argpartition. Hotels added to the catalog, or given a new
+description, are embedded on the next search.
+
+The default HashingEmbedder is deterministic and needs no model, so search works offline;
+Embed4AllEmbedder uses GPT4All's local embedding model instead.
+
+    results = getDescriptionIndex().search("eco-friendly places near the skyline", city="Tokyo", k=3)
+"""
+import functools
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from HotelCatalog import HotelCatalog, getCatalog, normalize
+
+# optional file prefix for the memory-mapped index, e.g. HOTEL_VECTORS_PATH=hotel_vectors
+VECTORS_PATH = os.getenv("HOTEL_VECTORS_PATH")
+
+INITIAL_CAPACITY = 1024
+
+# "hotel" is in nearly every description, so it says nothing about which one matches
+_STOP_WORDS = frozenset("a an and are at for from hotel in is it its near of on or the to with".split())
+
+
+@functools.lru_cache(maxsize=100000)
+def _bucket(token: str, dim: int):
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+class HashingEmbedder:
+    """
+    Bag of words and word pairs hashed into dim buckets (the "hashing trick"). Deterministic and
+    model-free: it matches shared vocabulary ("eco-friendly", "skyline") rather than meaning.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _tokens(self, text: str) -> list:
+        words = [_stem(word) for word in normalize(text).split() if word not in _STOP_WORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in self._tokens(text):
+                bucket, sign = _bucket(token, self.dim)
+                vectors[row, bucket] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class Embed4AllEmbedder:
+    """GPT4All's local sentence embedding model (downloaded on first use, then runs offline)."""
+
+    def __init__(self, model_name: str = None):
+        from gpt4all import Embed4All
+        self._model = Embed4All(model_name) if model_name else Embed4All()
+        self.name = f"embed4all-{model_name or 'default'}"
+        self.dim = len(self._model.embed("dimension probe"))
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.array([self._model.embed(text) for text in texts], dtype=np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class DescriptionIndex:
+    def __init__(self, catalog: HotelCatalog, embedder=None, path: str = None):
+        """
+        embedder: object with .dim and .embed(list of str) -> unit-length float32 rows, HashingEmbedder by default
+        path: file prefix for the memory-mapped vectors (<path>.vectors.npy, <path>.rowids.npy,
+              <path>.versions.npy); in memory when not given
+        """
+        self.catalog = catalog
+        self.embedder = embedder or HashingEmbedder()
+        self.path = path
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._count = 0
+        self._vectors = None  # (capacity, dim) float32, the first _count rows in use
+        self._rowids = None  # catalog rowid of each vector row, -1 for unused rows
+        self._versions = None  # catalog version of the description each row was embedded from
+        self._positions = {}  # catalog rowid -> vector row
+        if path and all(os.path.exists(file) for file in self._files()):
+            self._open()
+        if self._vectors is None:
+            self._allocate(INITIAL_CAPACITY)
+
+    def _files(self):
+        return f"{self.path}.vectors.npy", f"{self.path}.rowids.npy", f"{self.path}.versions.npy"
+
+    def _open(self):
+        vectors_file, rowids_file, versions_file = self._files()
+        vectors = np.load(vectors_file, mmap_mode="r+")
+        rowids = np.load(rowids_file, mmap_mode="r+")
+        versions = np.load(versions_file, mmap_mode="r+")
+        if vectors.shape[1] != self.embedder.dim or not len(rowids) == len(versions) == len(vectors):
+            return  # built with another embedder, start over
+        self._vectors, self._rowids, self._versions = vectors, rowids, versions
+        self._count = int(np.count_nonzero(rowids >= 0))
+        self._positions = {int(rowid): i for i, rowid in enumerate(rowids[:self._count])}
+
+    def _allocate(self, capacity: int):
+        """(Re)creates the arrays with room for capacity rows, keeping the rows in use."""
+        if self.path:
+            vectors_file, rowids_file, versions_file = self._files()
+            vectors = np.lib.format.open_memmap(vectors_file + ".tmp", mode="w+", dtype=np.float32,
+                                                shape=(capacity, self.embedder.dim))
+            rowids = np.lib.format.open_memmap(rowids_file + ".tmp", mode="w+", dtype=np.int64, shape=(capacity,))
+            versions = np.lib.format.open_memmap(versions_file + ".tmp", mode="w+", dtype=np.int64, shape=(capacity,))
+        else:
+            vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+            rowids = np.empty(capacity, dtype=np.int64)
+            versions = np.empty(capacity, dtype=np.int64)
+        rowids[:] = -1
+        versions[:] = -1
+        if self._count:
+            vectors[:self._count] = self._vectors[:self._count]
+            rowids[:self._count] = self._rowids[:self._count]
+            versions[:self._count] = self._versions[:self._count]
+        if self.path:
+            for array in (vectors, rowids, versions):
+                array.flush()
+            self._vectors = self._rowids = self._versions = None  # release the old maps before replacing their files
+            for file in self._files():
+                os.replace(file + ".tmp", file)
+        self._vectors, self._rowids, self._versions = vectors, rowids, versions
+
+    def _cursor(self) -> tuple:
+        """(version, rowid) of the newest description embedded; the catalog is read on from there."""
+        if not self._count:
+            return -1, 0
+        versions = self._versions[:self._count]
+        newest = int(versions.max())
+        return newest, int(self._rowids[:self._count][versions == newest].max())
+
+    def update(self) -> int:
+        """
+        Embeds the described hotels added to the catalog, or given a new description, since the
+        last update. Returns how many.
+        """
+        embedded = 0
+        with self._lock:
+            if self._count and not self.catalog.hotelsByRowid([self._rowids[self._count - 1]]):
+                self._count = 0  # the saved vectors belong to a different catalog
+                self._rowids[:] = -1
+                self._positions = {}
+            version, rowid = self._cursor()
+            while True:
+                rows = self.catalog.describedSince(version, rowid)
+                if not rows:
+                    break
+                new = sum(1 for rowid, _, _ in rows if rowid not in self._positions)
+                if self._count + new > len(self._vectors):
+                    self._allocate(max(len(self._vectors) * 2, self._count + new))
+                vectors = self.embedder.embed([description for _, description, _ in rows])
+                for vector, (rowid, _, version) in zip(vectors, rows):
+                    # a changed description replaces the hotel's old vector
+                    position = self._positions.get(rowid)
+                    if position is None:
+                        position = self._positions[rowid] = self._count
+                        self._count += 1
+                    self._vectors[position] = vector
+                    self._rowids[position] = rowid
+                    self._versions[position] = version
+                embedded += len(rows)
+                rowid, version = rows[-1][0], rows[-1][2]
+            if embedded and self.path:
+                for array in (self._vectors, self._rowids, self._versions):
+                    array.flush()
+        return embedded
+
+    def rebuild(self):
+        """Embeds every description again, e.g. after switching to another embedder."""
+        with self._lock:
+            self._count = 0
+            self._rowids[:] = -1
+            self._versions[:] = -1
+            self._positions = {}
+        self.update()
+
+    def search(self, query: str, city: str = None, k: int = 5) -> list:
+        """
+        The k hotels whose descriptions are closest to query, best first, as dicts with name, city,
+        country, description, hotel_id and score (cosine similarity). city limits the search to one city.
+        """
+        self.update()
+        q = self.embedder.embed([query])[0]
+        with self._lock:
+            self.queries += 1
+            rowids = self._rowids[:self._count]
+            if city is not None:
+                rows = np.flatnonzero(np.isin(rowids, self.catalog.rowidsIn(city)))
+                scores = self._vectors[rows] @ q
+            else:
+                rows = None
+                scores = self._vectors[:self._count] @ q
+            if not len(scores):
+                return []
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            picked = rowids[top if rows is None else rows[top]]
+            # nothing in common with the query at all is not a match
+            best = [(int(rowid), float(scores[i])) for rowid, i in zip(picked, top) if scores[i] > 0]
+        hotels = self.catalog.hotelsByRowid([rowid for rowid, _ in best])
+        return [dict(hotels[rowid], score=round(score, 3)) for rowid, score in best if rowid in hotels]
+
+    def __len__(self):
+        return self._count
+
+    def stats(self) -> dict:
+        return {"vectors": self._count, "capacity": len(self._vectors), "dim": self.embedder.dim,
+                "embedder": self.embedder.name, "queries": self.queries}
+
+
+def render(results: list) -> str:
+    """Text for the LLM: one line per hotel with its city, score and description."""
+    if not results:
+        return "No matching hotels found."
+    return "".join(f"{hotel['name']} ({hotel['city']}, match {hotel['score']:.2f}): {hotel['description']}\n"
+                   for hotel in results)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def getDescriptionIndex() -> DescriptionIndex:
+    """The process-wide index over getCatalog(), memory-mapped under HOTEL_VECTORS_PATH if set."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DescriptionIndex(getCatalog(), path=VECTORS_PATH)
+    return _index
+
+
+def searchDescriptions(query: str, city: str = None, k: int = 5) -> str:
+    return render(getDescriptionIndex().search(query, city=city, k=k))
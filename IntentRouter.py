@@ -0,0 +1,205 @@
+"""
+Fast path in front of the LLM for requests that are really just a tool call.
+Each Route is a compiled pattern plus a handler that answers from the tools; a request matching
+a route whose handler is confident (returns something other than None) is answered directly in
+milliseconds, everything else goes on to the LLM as before.
+
+In a LangGraph graph the router is a node ahead of the chatbot:
+
+    graph_builder.add_node("router", router.node)
+    graph_builder.add_edge(START, "router")
+    graph_builder.add_conditional_edges("router", router.next, {"chatbot": "chatbot", END: END})
+
+and for LangChain agents RoutedAgent(initialize_agent(...), router) does the same around run().
+"""
+import functools
+import inspect
+import re
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END
+
+NUMBER = r"-?\d+(?:\.\d+)?"
+
+# "hotels in Paris", "please get me the name of some hotels in Paris", "which hotels are there in NYC?"
+FIND_HOTELS = (r"(?:please\s+)?(?:(?:can|could)\s+you\s+)?(?:(?:show|list|find|get|give)\s+(?:me\s+)?)?"
+               r"(?:the\s+)?(?:names?\s+of\s+)?(?:some\s+|the\s+|all\s+)?(?:hotels?|places\s+to\s+stay)"
+               r"\s+in\s+(?P<city>[^?.!,]+?)\s*(?:please)?\s*[?.!]*"
+               r"|(?:which|what)\s+hotels\s+are\s+(?:there\s+)?in\s+(?P<city2>[^?.!,]+?)\s*[?.!]*")
+# "describe Hotel A", "tell me about Hotel B?"
+DESCRIBE_HOTEL = r"(?:please\s+)?(?:describe|tell\s+me\s+about|what\s+is|what's)\s+(?P<name>[^?!]+?)\s*[?.!]*"
+
+
+class Route:
+    __slots__ = ("name", "pattern", "handler")
+
+    def __init__(self, name: str, pattern: str, handler):
+        """handler(match) returns the answer, or None when it isn't confident and the LLM should answer."""
+        self.name = name
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.handler = handler
+
+
+def hotelRoutes(find=None, describe=None, catalog=None) -> list:
+    """
+    Routes for "hotels in <city>" and "describe <hotel>", answered by the given tool functions
+    find(city) and describe(name); leave one out when the bot has no such tool. They only fire
+    for cities and hotels the catalog knows.
+    """
+    if catalog is None:
+        from HotelCatalog import getCatalog
+        catalog = getCatalog()
+
+    def findHotels(match):
+        city = match["city"] or match["city2"]
+        return find(city) if catalog.resolveCity(city) is not None else None
+
+    def describeHotel(match):
+        return describe(match["name"]) if catalog.describe(match["name"]) is not None else None
+
+    routes = []
+    if find is not None:
+        routes.append(Route("find_hotels", FIND_HOTELS, findHotels))
+    if describe is not None:
+        routes.append(Route("describe_hotel", DESCRIBE_HOTEL, describeHotel))
+    return routes
+
+
+class IntentRouter:
+    def __init__(self, routes=()):
+        self.routes = list(routes)
+        self.hits = 0
+        self.misses = 0
+        self.route_hits = {}
+        self.routing_seconds = 0.0
+        self.fallbacks = 0
+        self.fallback_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, pattern: str, handler):
+        self.routes.append(Route(name, pattern, handler))
+
+    def route(self, text: str):
+        """The answer for text from the first confident route, or None to let the LLM answer."""
+        start = time.perf_counter()
+        text = text.strip()
+        answer = route = None
+        for route in self.routes:
+            match = route.pattern.fullmatch(text)
+            if match is None:
+                continue
+            try:
+                answer = route.handler(match)
+            except Exception:
+                answer = None  # a tool that fails here gets another chance through the LLM
+            if answer is not None:
+                break
+        with self._lock:
+            self.routing_seconds += time.perf_counter() - start
+            if answer is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.route_hits[route.name] = self.route_hits.get(route.name, 0) + 1
+        return answer if isinstance(answer, str) else str(answer)
+
+    def recordFallback(self, seconds: float):
+        """Time the LLM took for a request the router passed on; used to estimate the time saved."""
+        with self._lock:
+            self.fallbacks += 1
+            self.fallback_seconds += seconds
+
+    def timed(self, func):
+        """Wraps the LLM node (sync or async) so its run time is recorded with recordFallback."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timedAsync(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.recordFallback(time.perf_counter() - start)
+            return timedAsync
+
+        @functools.wraps(func)
+        def timedSync(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.recordFallback(time.perf_counter() - start)
+        return timedSync
+
+    # --- LangGraph ---
+
+    def node(self, state) -> dict:
+        """Graph node: answers the latest human message if a route matches, otherwise leaves the state alone."""
+        messages = state["messages"]
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return {"messages": []}
+        answer = self.route(messages[-1].content)
+        if answer is None:
+            return {"messages": []}
+        return {"messages": [AIMessage(content=answer, response_metadata={"routed": True})]}
+
+    def next(self, state, fallback: str = "chatbot"):
+        """Conditional edge after node(): END when the router answered, else the LLM node."""
+        messages = state["messages"]
+        return END if messages and isinstance(messages[-1], AIMessage) else fallback
+
+    # --- reporting ---
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        average_llm = self.fallback_seconds / self.fallbacks if self.fallbacks else None
+        return {
+            "requests": total,
+            "hits": self.hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "route_hits": dict(self.route_hits),
+            "average_routing_ms": 1000 * self.routing_seconds / total if total else 0.0,
+            "average_llm_s": average_llm,
+            # each hit skipped an LLM run of about the average length seen for the misses
+            "estimated_saved_s": self.hits * average_llm if average_llm is not None else None,
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        saved = stats["estimated_saved_s"]
+        saved_text = f", ~{saved:.1f}s of LLM time saved" if saved is not None else ""
+        return (f"[router: {stats['hits']}/{stats['requests']} answered directly ({stats['hit_rate']:.0%}), "
+                f"{stats['average_routing_ms']:.2f}ms per request{saved_text}]")
+
+
+class RoutedAgent:
+    """Wraps an agent from initialize_agent so routed requests skip it. Everything else is passed through."""
+
+    def __init__(self, agent, router: IntentRouter):
+        self.agent = agent
+        self.router = router
+
+    def run(self, text: str, *args, **kwargs):
+        answer = self.router.route(text) if isinstance(text, str) else None
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        try:
+            return self.agent.run(text, *args, **kwargs)
+        finally:
+            self.router.recordFallback(time.perf_counter() - start)
+
+    def invoke(self, input, *args, **kwargs):
+        text = input.get("input") if isinstance(input, dict) else input
+        answer = self.router.route(text) if isinstance(text, str) else None
+        if answer is not None:
+            return {"input": text, "output": answer}
+        start = time.perf_counter()
+        try:
+            return self.agent.invoke(input, *args, **kwargs)
+        finally:
+            self.router.recordFallback(time.perf_counter() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.agent, attr)
@@ -0,0 +1,207 @@
+"""
+Response cache for LLM calls.
+Keys are the normalised prompt plus the sampling parameters, so the same question asked with the
+same settings is answered without generating again. Near-duplicates share an entry: prompts that
+differ only in letter case, spacing, or the . ? ! ending a sentence ("Hotels in Paris?" and
+"hotels in  paris"). Any other change in punctuation or wording is a different prompt. Entries live in an in-memory LRU and,
+optionally, in a SQLite file whose total size is capped by evicting the least recently used rows.
+Calls sampled above max_temperature (0.5 by default, so GPT4All's default of 0.7 is not cached)
+are never cached, since their output is meant to vary.
+
+The same cache plugs into LangChain models via asLangChainCache(). LangChain only hands a cache
+the model's parameters as a string, so give it the temperature (GPT4AllLangChain reads it from
+its own parameters instead):
+
+    ChatOpenAI(temperature=0, cache=getCache().asLangChainCache(temperature=0))
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.caches import BaseCache
+
+# optional on-disk tier, e.g. LLM_CACHE_PATH=llm_cache.sqlite
+CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+DEFAULT_MAX_TEMPERATURE = 0.5  # anything sampled hotter than this is not cached
+DEFAULT_MAX_DISK_BYTES = 64 * 1024 * 1024
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"[.?!]+(?=\s|$)")
+
+
+def normalizePrompt(prompt: str) -> str:
+    """Lowercased, . ? ! ending a sentence dropped and whitespace collapsed: "Hotels in  Paris?" -> "hotels in paris"."""
+    return _WHITESPACE.sub(" ", _SENTENCE_END.sub("", prompt.casefold())).strip()
+
+
+class LLMCache:
+    def __init__(self, max_entries: int = 512, path: str = None, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 max_temperature: float = DEFAULT_MAX_TEMPERATURE):
+        """
+        max_entries: size of the in-memory LRU tier
+        path: optional SQLite file for the on-disk tier
+        max_disk_bytes: total size of stored values above which the disk tier evicts old entries
+        max_temperature: calls with a higher temperature bypass the cache
+        """
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache "
+                             "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def key(prompt: str, **params) -> str:
+        payload = normalizePrompt(prompt) + "\x00" + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def cacheable(self, temperature) -> bool:
+        return temperature is None or float(temperature) <= self.max_temperature
+
+    def get(self, prompt: str, **params):
+        """Cached response for prompt with these sampling params (temp, top_p, max_tokens, ...), or None."""
+        return self._lookup(self.key(prompt, **params), params.get("temp", params.get("temperature")))
+
+    def put(self, prompt: str, value, **params):
+        self._store(self.key(prompt, **params), value, params.get("temp", params.get("temperature")))
+
+    def _lookup(self, key: str, temperature):
+        if not self.cacheable(temperature):
+            self.bypassed += 1
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    value = pickle.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, value, temperature):
+        if not self.cacheable(temperature):
+            return
+        with self._lock:
+            self._remember(key, value)
+            if self._db is None:
+                return
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            old = self._db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", (key, blob, len(blob), time.time()))
+            self._disk_bytes += len(blob) - (old[0] if old else 0)
+            self._evictDisk()
+            self._db.commit()
+
+    def _remember(self, key: str, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evictDisk(self):
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = self._db.execute("SELECT key, size FROM llm_cache ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                return
+            for key, size in rows:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def asLangChainCache(self, temperature: float = None, params=None) -> "LangChainLLMCache":
+        """
+        Adapter for the cache= argument of LangChain LLMs and chat models.
+        temperature: the model's sampling temperature, checked against max_temperature
+        params: function returning the model's parameters, read for "temp" or "temperature" on
+                every call instead of the fixed temperature
+        """
+        return LangChainLLMCache(self, temperature, params)
+
+
+class LangChainLLMCache(BaseCache):
+    """LangChain BaseCache backed by an LLMCache; llm_string already carries the model's parameters."""
+
+    def __init__(self, cache: LLMCache, temperature: float = None, params=None):
+        self.cache = cache
+        self.temperature = temperature
+        self.params = params
+
+    def forModel(self, params) -> "LangChainLLMCache":
+        """The same cache, reading the temperature from params() (e.g. an LLM's _identifying_params)."""
+        return LangChainLLMCache(self.cache, self.temperature, params)
+
+    def _temperature(self, llm_string: str):
+        if self.params is None:
+            return self.temperature
+        params = self.params()
+        return params.get("temp", params.get("temperature", self.temperature))
+
+    def lookup(self, prompt: str, llm_string: str):
+        return self.cache._lookup(LLMCache.key(prompt, llm=llm_string), self._temperature(llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        self.cache._store(LLMCache.key(prompt, llm=llm_string), return_val, self._temperature(llm_string))
+
+    def clear(self, **kwargs) -> None:
+        self.cache.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def getCache() -> LLMCache:
+    """The process-wide LLM cache, with a disk tier when LLM_CACHE_PATH is set."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(path=CACHE_PATH)
+    return _cache
@@ -1,29 +1,197 @@
+import argparse
+import threading
+import time
+from collections import OrderedDict
 from typing import Annotated
 from typing_extensions import TypedDict
-from gpt4all import GPT4All
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
+from langgraph.config import get_stream_writer
 from langchain.schema import AIMessage, HumanMessage
 from langchain_core.tools import tool
+
+from ConversationStore import CONVERSATION_PATH, ConversationStore
+from HotelCatalog import getCatalog
+from HotelSearch import searchDescriptions
+from IntentRouter import IntentRouter, hotelRoutes
+from LLMCache import LLMCache, getCache
+from ModelRegistry import getModel, getPromptSession, preloadModel
+from Streaming import StopSequenceMatcher, TurnStats, estimateTokens
+from Tracing import tracer
 # --- Wrapper to handle memory + current input ---
 
 class ChatLLMWrapper:
-    def __init__(self, model, context_size=3):
+    SYSTEM_PROMPT = "You are a helpful assistant. Answer questions directly and accurately. Do not make up or hallucinate previous conversation history."
+
+    def __init__(self, model, context_size=3, reuse_session=False, conversation_id="default", cache: LLMCache = None,
+                 token_budget=None, count_tokens=estimateTokens, summarize=False):
+        """
+        reuse_session: keep the model's chat session between turns and only process the new part
+                       of the prompt (see PromptSession). The history window then slides in jumps
+                       rather than every turn, so consecutive prompts share their prefix.
+        cache: optional LLMCache answering prompts that were already generated with the same settings
+        token_budget: if set, history is chosen by size instead of context_size: as many of the most
+                      recent messages as fit in this many tokens (system prompt and summary included)
+        count_tokens: function giving the token count of a string, results are cached per message
+        summarize: fold messages that drop out of the window into a rolling summary placed at the
+                   top of the prompt, refreshed at window jumps when reusing the session and on
+                   a background thread between replies otherwise
+        """
         self.model = model
+        self.cache = cache
         self.context_size = context_size  # last N exchanges
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.conversation_id = conversation_id
+        self.reuse_session = reuse_session
+        self.summarize = summarize
+        self.summary = ""
+        self._window_anchor = None  # id of the first message in the window when reusing the session
+        self._token_counts = OrderedDict()  # message id -> (content, token count)
+        self._summarized = set()  # ids of messages already folded into the summary
+        self._summary_thread = None
+        self._replying = threading.Event()  # set while a reply is built, so the summary yields the model
+
+    @property
+    def session(self):
+        """The model's shared PromptSession when reusing it, looked up each time since the model may be reloaded."""
+        return getPromptSession(self.model) if self.reuse_session else None
+
+    def _messageTokens(self, msg) -> int:
+        cached = self._token_counts.get(msg.id)
+        if cached is not None and cached[0] is msg.content:
+            self._token_counts.move_to_end(msg.id)
+            return cached[1]
+        count = self.count_tokens(msg.content) + 2  # role label and newline
+        if msg.id is not None:
+            self._token_counts[msg.id] = (msg.content, count)
+            while len(self._token_counts) > 4096:
+                self._token_counts.popitem(last=False)
+        return count
 
-    def invoke(self, messages: list) -> AIMessage:
+    def _fitBudget(self, messages: list, budget: int) -> int:
+        """Index of the oldest message such that messages[index:] fits in budget (always keeps the last one)."""
+        used = 0
+        for start in range(len(messages) - 1, -1, -1):
+            used += self._messageTokens(messages[start])
+            if used > budget and start < len(messages) - 1:
+                return start + 1
+        return 0
+
+    def _window(self, messages: list) -> list:
+        if not messages:
+            return messages
+        if self.token_budget is None:
+            limit = self.context_size * 2
+            if not self.reuse_session:
+                # Keep last N message pairs (human + assistant)
+                return messages[-limit:] if len(messages) > limit else messages
+            # Grow the window from a fixed first message until it holds twice the usual history,
+            # then jump forward to the last N pairs. Between jumps every prompt extends the previous one.
+            ids = [msg.id for msg in messages]
+            start = ids.index(self._window_anchor) if self._window_anchor in ids else max(0, len(messages) - limit)
+            if len(messages) - start > limit * 2:
+                start = len(messages) - limit
+        else:
+            budget = self.token_budget - self.count_tokens(self.SYSTEM_PROMPT) - self.count_tokens(self.summary)
+            if not self.reuse_session:
+                start = self._fitBudget(messages, budget)
+            else:
+                # Same idea as above: keep the first message fixed while the history fits,
+                # and when it no longer does, jump to the newest messages filling half the budget.
+                ids = [msg.id for msg in messages]
+                start = ids.index(self._window_anchor) if self._window_anchor in ids else 0
+                if sum(self._messageTokens(msg) for msg in messages[start:]) > budget:
+                    start = self._fitBudget(messages, budget // 2)
+        self._window_anchor = messages[start].id
+        if self.summarize and start > 0:
+            self._refreshSummary(messages[:start])
+        return messages[start:]
+
+    def _summaryLimit(self) -> int:
+        # about a quarter of the budget, so the summary can't crowd out the recent messages
+        return (self.token_budget or 1200) // 4
+
+    def _capTokens(self, text: str, limit: int) -> str:
+        """The longest run of leading words of text that count_tokens puts at no more than limit."""
+        if self.count_tokens(text) <= limit:
+            return text
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:middle])) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
+
+    def _generateSummary(self, prompt: str, **kwargs) -> str:
+        with tracer.span("summary", "llm", prompt_chars=len(prompt)):
+            # the model's context is given over to the summary, so the reply session starts over next time
+            with getPromptSession(self.model).exclusive() as model:
+                text = model.generate(prompt, max_tokens=120, temp=0.2, **kwargs)
+        return self._capTokens(text.strip().split("\n\n")[0], self._summaryLimit())
+
+    def _refreshSummary(self, older: list):
+        """
+        Updates the summary with the messages that left the window.
+        When reusing the session this only happens at a window jump, where the reply re-processes
+        its whole prompt anyway, so the summary is written right there, before the reply; written
+        at any other time it would cost the reply session its prefix. Otherwise it is written on a
+        background thread while no reply is being generated, and a reply that comes in meanwhile
+        stops it at its next token (it is retried on a later turn).
+        """
+        new = [msg for msg in older if msg.id not in self._summarized]
+        if not new or (self._summary_thread is not None and self._summary_thread.is_alive()):
+            return
+        self._summarized.update(msg.id for msg in new)
+        lines = [f"{'Human' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}" for msg in new]
+        prompt = (
+            "Summarize the conversation below in a few short sentences, keeping names, places and decisions.\n\n"
+            + (f"Earlier summary: {self.summary}\n\n" if self.summary else "")
+            + "\n".join(lines)
+            + "\n\nSummary:"
+        )
+        if self.reuse_session:
+            self.summary = self._generateSummary(prompt)
+            return
+
+        def run():
+            while self._replying.is_set():
+                time.sleep(0.05)
+            summary = self._generateSummary(prompt, callback=lambda token_id, token: not self._replying.is_set())
+            if self._replying.is_set():
+                self._summarized.difference_update(msg.id for msg in new)
+                return
+            self.summary = summary
+
+        self._summary_thread = threading.Thread(target=run, daemon=True, name="history-summary")
+        self._summary_thread.start()
+
+    def invoke(self, messages: list, on_token=None) -> AIMessage:
         """
         messages: list of HumanMessage/AIMessage objects
+        on_token: optional function called with the displayable text of every generated token,
+                  never with an empty string
+        Generation stops as soon as the model starts writing the next "Human:" turn.
         Returns AIMessage
         """
-        # Keep last N message pairs (human + assistant)
-        relevant_messages = messages[-(self.context_size * 2):] if len(messages) > (self.context_size * 2) else messages
+        self._replying.set()
+        try:
+            return self._reply(messages, on_token)
+        finally:
+            self._replying.clear()
+
+    def _reply(self, messages: list, on_token) -> AIMessage:
+        relevant_messages = self._window(messages)
 
         # Build a clean, structured prompt
-        system_prompt = "You are a helpful assistant. Answer questions directly and accurately. Do not make up or hallucinate previous conversation history."
+        system_prompt = self.SYSTEM_PROMPT
         
         context_parts = [system_prompt, ""]
+        if self.summary:
+            context_parts.extend([f"Summary of the earlier conversation: {self.summary}", ""])
         
         for msg in relevant_messages:
             if isinstance(msg, HumanMessage):
@@ -37,13 +205,40 @@ class ChatLLMWrapper:
         prompt = "\n".join(context_parts)
         
         # Generate response with stricter parameters to reduce hallucination
-        response = self.model.generate(
-            prompt, 
+        generate_kwargs = dict(
             max_tokens=150,
             temp=0.3,     
             top_p=0.8,       
             repeat_penalty=1.1, 
         )
+        cached = self.cache.get(prompt, **generate_kwargs) if self.cache is not None else None
+        if cached is not None:
+            if on_token and cached:
+                on_token(cached)
+            return AIMessage(content=cached)
+
+        matcher = StopSequenceMatcher(["Human:", "\nYou:"])
+        tokens = 0
+
+        def callback(token_id, token):
+            nonlocal tokens
+            tokens += 1
+            text = matcher.feed(token)
+            # empty while the matcher holds back what might be the start of a stop sequence
+            if on_token and text:
+                on_token(text)
+            return not matcher.stopped
+
+        with tracer.span("gpt4all", "llm", prompt_chars=len(prompt)):
+            start = time.perf_counter()
+            if self.reuse_session:
+                response = self.session.generate(prompt, conversation_id=self.conversation_id, callback=callback, **generate_kwargs)
+            else:
+                with getPromptSession(self.model).exclusive() as model:
+                    response = model.generate(prompt, callback=callback, **generate_kwargs)
+            tracer.llmTokens("gpt4all", tokens, time.perf_counter() - start)
+        if on_token and (tail := matcher.flush()):
+            on_token(tail)
         
         response = response.strip()
         
@@ -65,6 +260,8 @@ class ChatLLMWrapper:
                 clean_lines.append(line)
         
         response = '\n'.join(clean_lines).strip()
+        if self.cache is not None:
+            self.cache.put(prompt, response, **generate_kwargs)
             
         return AIMessage(content=response)
 
@@ -72,65 +269,123 @@ class State(TypedDict):
     messages: Annotated[list, add_messages]
 
 
-def chatbot(state: State):
-    """Process the conversation state and generate a response"""
-    messages = state["messages"]
-    
-    # Generate response using our wrapper
-    response = chat_llm.invoke(messages)
-    
-    return {"messages": [response]}
-hotels = {
-    "Paris": ["Hotel A", "Hotel B", "Hotel C"],
-    "New York": ["Hotel D", "Hotel E", "Hotel F"],
-    "Tokyo": ["Hotel G", "Hotel H", "Hotel I"]
-}
-hotel_descriptions = {
-    "Hotel A": "A budget-friendly hotel with basic amenities.",
-    "Hotel B": "A mid-range hotel with comfortable rooms and free breakfast.",
-    "Hotel C": "A luxury hotel with a spa and fine dining.",
-    "Hotel D": "A budget hotel located in the heart of the city.",
-    "Hotel E": "A boutique hotel with unique decor and personalized service.",
-    "Hotel F": "A family-friendly hotel with a pool and play area.",
-    "Hotel G": "A modern hotel with stunning views of the city skyline.",
-    "Hotel H": "An eco-friendly hotel with sustainable practices.",
-    "Hotel I": "A traditional hotel with a rich history."
-}
+def buildGraph(chat_llm: ChatLLMWrapper, router: IntentRouter = None):
+    """The chat graph around a ChatLLMWrapper (Benchmark.py passes one over a scripted model)."""
+    @tracer.traced("chatbot")
+    def chatbot(state: State):
+        """Process the conversation state and generate a response"""
+        messages = state["messages"]
+        
+        # Generate response using our wrapper, passing tokens on to graph.stream(stream_mode="custom")
+        writer = get_stream_writer()
+        response = chat_llm.invoke(messages, on_token=lambda token: writer({"token": token}))
+        
+        return {"messages": [response]}
+
+    @tracer.traced("router")
+    def route(state: State):
+        update = router.node(state)
+        if update["messages"]:
+            get_stream_writer()({"token": update["messages"][0].content})
+        return update
+
+    graph_builder = StateGraph(State)
+    if router is not None:
+        graph_builder.add_node("router", route)
+        graph_builder.add_node("chatbot", router.timed(chatbot))
+        graph_builder.add_edge(START, "router")
+        graph_builder.add_conditional_edges("router", router.next, {"chatbot": "chatbot", END: END})
+    else:
+        graph_builder.add_node("chatbot", chatbot)
+        graph_builder.add_edge(START, "chatbot")
+    graph_builder.add_edge("chatbot", END)
+    return graph_builder.compile()
+
 @tool
 def findHotels(city: str) -> str:
     """Returns a list of hotels
     Args:
         city (str): The name of the city to find hotels in.
     """
-    city = city.strip("'\" ")
-    if city in hotels:
-        return ", ".join(hotels[city])
+    found = getCatalog().hotelsIn(city.strip("'\" "))
+    if found:
+        return ", ".join(found)
     return "No hotels found."
 
+@tool
+def findHotelsBatch(cities: list[str]) -> dict:
+    """Returns the hotels in each of several cities at once
+    Args:
+        cities (list[str]): The names of the cities to find hotels in.
+    """
+    return getCatalog().hotelsInMany([city.strip("'\" ") for city in cities])
+
+@tool
+def describeHotelsBatch(hotel_names: list[str] = None, city: str = None) -> dict:
+    """Returns the descriptions of several hotels at once, or of every hotel in a city
+    Args:
+        hotel_names (list[str]): The names of the hotels to describe.
+        city (str): A city whose hotels should all be described, instead of hotel_names.
+    """
+    if city:
+        return getCatalog().describeCity(city)
+    return getCatalog().describeMany(hotel_names or [])
+
+@tool
+def searchHotelDescriptions(query: str, city: str = None) -> str:
+    """Returns the hotels whose descriptions best match what the user is looking for, with their descriptions
+    Args:
+        query (str): What the user is looking for, e.g. "eco-friendly with a view".
+        city (str): Optional city to search in.
+    """
+    return searchDescriptions(query, city=city)
+
 # Initialize components
-llm = GPT4All("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")
-chat_llm = ChatLLMWrapper(llm, context_size=3)
+llm = getModel("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")  # loaded on first use
+chat_llm = ChatLLMWrapper(llm, reuse_session=True, cache=getCache(), token_budget=1200, summarize=True)
 
-tools = [findHotels]
+tools = [findHotels, findHotelsBatch, describeHotelsBatch, searchHotelDescriptions]
 tool_map = {tool.name: tool for tool in tools}
-# Build graph
-graph_builder = StateGraph(State)
-graph_builder.add_node("chatbot", chatbot)
-graph_builder.add_edge(START, "chatbot")
-graph_builder.add_edge("chatbot", END)
 
-graph = graph_builder.compile()
+# "hotels in Paris" and the like are answered from the tools without waking the model
+router = IntentRouter(hotelRoutes(find=lambda city: findHotels.invoke({"city": city}),
+                                  describe=lambda name: getCatalog().describe(name)))
+
+# Build graph
+graph = buildGraph(chat_llm, router)
 
 print("Chatbot initialized successfully!")
 print("ASCII Graph:")
 print(graph.get_graph().draw_ascii())
 
+def stream_turn(state: dict) -> dict:
+    """Runs one turn, printing tokens as they are generated. Returns the final graph state."""
+    stats = TurnStats()
+    result = None
+    print("Assistant: ", end="", flush=True)
+    with tracer.span("turn", "turn"):
+        for mode, chunk in graph.stream(state, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                stats.token()
+                print(chunk["token"], end="", flush=True)
+            else:
+                result = chunk
+    stats.finish()
+    print()
+    print(stats.report())
+    return result
+
 # --- Main conversation loop ---
-def main():
-    conversation_state = {"messages": []}
+def main(stream_tokens: bool = True, history_path: str = CONVERSATION_PATH, session_id: str = "default"):
+    # start loading the model while the banner is printed and the user types
+    preloadModel("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")
+    # only a window of recent messages stays in memory; with a path the rest is checkpointed there
+    store = ConversationStore(path=history_path, session_id=session_id)
     
     print("\n=== GPT4All Chatbot ===")
     print("Type 'quit', 'exit', or 'q' to end the conversation")
+    if len(store):
+        print(f"Resumed session '{session_id}' ({len(store)} messages)")
     print("-" * 40)
     
     while True:
@@ -138,6 +393,10 @@ def main():
             user_input = input("\nYou: ").strip()
             
             if user_input.lower() in ["quit", "exit", "q"]:
+                print(router.report())
+                if tracer.enabled:
+                    print(tracer.summary())
+                    tracer.close()
                 print("Goodbye!")
                 break
                 
@@ -146,18 +405,23 @@ def main():
                 continue
             
             # Add user message to conversation
-            user_message = HumanMessage(content=user_input)
-            conversation_state["messages"].append(user_message)
+            store.append([HumanMessage(content=user_input)])
+            conversation_state = {"messages": store.messages()}
             
             # Get AI response using the graph
-            result = graph.invoke(conversation_state)
+            if stream_tokens:
+                result = stream_turn(conversation_state)
+            else:
+                with tracer.span("turn", "turn"):
+                    result = graph.invoke(conversation_state)
             
-            # Update conversation state with the response
-            conversation_state["messages"].extend(result["messages"])
+            # The result holds the input messages too (add_messages merges them), only new ones are stored
+            store.append(result["messages"])
             
             # Print the AI response
-            ai_response = result["messages"][-1].content
-            print(f"Assistant: {ai_response}")
+            if not stream_tokens:
+                ai_response = result["messages"][-1].content
+                print(f"Assistant: {ai_response}")
             
         except KeyboardInterrupt:
             print("\n\nGoodbye!")
@@ -167,4 +431,9 @@ def main():
             print("Please try again.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-stream", action="store_true", help="print each reply only once it is complete")
+    parser.add_argument("--history", default=CONVERSATION_PATH, help="SQLite file the conversation is checkpointed to")
+    parser.add_argument("--session", default="default", help="conversation to resume or start in the history file")
+    args = parser.parse_args()
+    main(stream_tokens=not args.no_stream, history_path=args.history, session_id=args.session)
\ No newline at end of file
@@ -0,0 +1,277 @@
+"""
+Local inference scheduler for GPT4All models.
+A ModelPool starts a number of worker processes that each load the model once and run on a
+share of the CPU cores. Requests wait in per-conversation queues that are served round-robin,
+so one busy conversation can't starve the others, and can be cancelled while queued or running.
+
+    pool = ModelPool("Meta-Llama-3-8B-Instruct.Q4_0.gguf", workers=4)
+    future = pool.submit("Hello", conversation_id="alice", max_tokens=50)
+    print(future.result(), pool.stats())
+"""
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future
+
+from Streaming import StopSequenceMatcher
+
+
+def _workerMain(model_name, device, n_threads, conn, cancel_event, model_factory=None):
+    """Runs in the worker process: load the model once, then serve prompts until told to stop."""
+    if model_factory is None:
+        from gpt4all import GPT4All as model_factory
+    try:
+        model = model_factory(model_name, device=device, n_threads=n_threads)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        prompt, stop, generate_kwargs = request
+        matcher = StopSequenceMatcher(stop)
+        parts = []
+
+        def callback(token_id, token):
+            text = matcher.feed(token)
+            if text:
+                parts.append(text)
+            return not matcher.stopped and not cancel_event.is_set()
+
+        try:
+            with model.chat_session():
+                model.generate(prompt, callback=callback, **generate_kwargs)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        if cancel_event.is_set():
+            conn.send(("cancelled", None))
+            continue
+        if not matcher.stopped:
+            parts.append(matcher.flush())
+        conn.send(("ok", "".join(parts)))
+
+
+class _Request:
+    __slots__ = ("prompt", "stop", "kwargs", "conversation_id", "future", "worker")
+
+    def __init__(self, prompt, stop, kwargs, conversation_id):
+        self.prompt = prompt
+        self.stop = stop
+        self.kwargs = kwargs
+        self.conversation_id = conversation_id
+        self.future = Future()
+        self.worker = None
+
+
+class _Worker:
+    def __init__(self, index: int, process, conn, cancel_event):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.cancel_event = cancel_event
+        self.current = None
+        self.busy_seconds = 0.0
+        self.completed = 0
+        self.alive = True
+
+
+class ModelPool:
+    def __init__(self, model_name: str, workers: int = 2, device: str = "cpu", n_threads: int = None, model_factory=None):
+        """
+        workers: number of model processes, each holding its own copy of the model
+        n_threads: CPU threads per worker, by default the cores split evenly between workers
+        model_factory: picklable callable (model_name, device=, n_threads=) building the model in each
+                       worker instead of gpt4all.GPT4All, e.g. FakeModels.scriptedModel for benchmarks
+        """
+        self.model_name = model_name
+        self.started = time.monotonic()
+        self._queues = OrderedDict()  # conversation_id -> deque of _Request, served round-robin
+        self._cond = threading.Condition()
+        self._closed = False
+        self._requests = weakref.WeakKeyDictionary()  # Future -> _Request, for cancel()
+        if n_threads is None:
+            n_threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn rather than fork: the parent may already hold threads and native model state
+        ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+        for index in range(workers):
+            parent_conn, child_conn = ctx.Pipe()
+            cancel_event = ctx.Event()
+            process = ctx.Process(target=_workerMain, args=(model_name, device, n_threads, child_conn, cancel_event, model_factory),
+                                  daemon=True)
+            process.start()
+            worker = _Worker(index, process, parent_conn, cancel_event)
+            self._workers.append(worker)
+            threading.Thread(target=self._dispatch, args=(worker,), daemon=True).start()
+
+    def submit(self, prompt: str, conversation_id="default", stop=None, **generate_kwargs) -> Future:
+        """
+        Queues a prompt; the Future resolves to the generated text (cut at the first stop sequence).
+        Once every worker has died the Future fails at once instead of waiting for one.
+        """
+        request = _Request(prompt, stop, generate_kwargs, conversation_id)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ModelPool is closed")
+            if not any(worker.alive and worker.process.is_alive() for worker in self._workers):
+                request.future.set_exception(RuntimeError("all model workers have died"))
+                return request.future
+            self._queues.setdefault(conversation_id, deque()).append(request)
+            self._requests[request.future] = request
+            self._cond.notify()
+        return request.future
+
+    def cancel(self, future: Future) -> bool:
+        """Cancels a queued request, or stops generation of a running one."""
+        with self._cond:
+            request = self._requests.get(future)
+            if request is None:
+                return False
+            queue = self._queues.get(request.conversation_id)
+            if queue and request in queue:
+                queue.remove(request)
+                if not queue:
+                    del self._queues[request.conversation_id]
+                if future.running():  # requeued after its worker died
+                    future.set_exception(CancelledError())
+                    return True
+                return future.cancel()
+            if request.worker is not None and request.worker.current is request:
+                request.worker.cancel_event.set()
+                return True
+        return False
+
+    def _next(self, worker: _Worker):
+        """
+        Blocks for the next request, taking one from each conversation in turn, and hands it to
+        worker in the same step, so cancel() always finds it either queued or on its worker.
+        """
+        with self._cond:
+            while True:
+                while not self._queues and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                conversation_id, queue = next(iter(self._queues.items()))
+                request = queue.popleft()
+                del self._queues[conversation_id]
+                if queue:
+                    self._queues[conversation_id] = queue  # back of the line
+                # a requeued request is already running
+                if request.future.running() or request.future.set_running_or_notify_cancel():
+                    worker.cancel_event.clear()
+                    worker.current = request
+                    request.worker = worker
+                    return request
+
+    def _requeue(self, request: _Request):
+        """Puts a request its worker never got back at the head of its conversation, or fails it if no worker is left."""
+        with self._cond:
+            if not self._closed and any(w.alive for w in self._workers):
+                queue = self._queues.get(request.conversation_id)
+                if queue is None:
+                    queue = self._queues[request.conversation_id] = deque()
+                self._queues.move_to_end(request.conversation_id, last=False)
+                queue.appendleft(request)
+                request.worker = None
+                self._cond.notify()
+                return
+        request.future.set_exception(RuntimeError("all model workers have died"))
+
+    def _dispatch(self, worker: _Worker):
+        try:
+            status, error = worker.conn.recv()
+        except EOFError:
+            status, error = "error", "worker exited during startup"
+        if status != "ready":
+            with self._cond:
+                worker.alive = False
+            self._failPending(RuntimeError(f"model worker {worker.index} failed to start: {error}"))
+            return
+        while True:
+            request = self._next(worker)
+            if request is None:
+                return
+            start = time.monotonic()
+            sent = False
+            try:
+                # a worker that died while idle hasn't touched the request, another one can take it
+                if not worker.process.is_alive():
+                    raise EOFError("process exited while idle")
+                worker.conn.send((request.prompt, request.stop, request.kwargs))
+                sent = True
+                status, result = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                with self._cond:
+                    worker.alive = False
+                    worker.current = None
+                if sent:
+                    # died generating it; the prompt itself may be what kills workers, so it isn't retried
+                    request.future.set_exception(RuntimeError(f"model worker {worker.index} died: {e}"))
+                else:
+                    self._requeue(request)
+                self._failPending(RuntimeError("all model workers have died"))
+                return
+            finally:
+                worker.busy_seconds += time.monotonic() - start
+            with self._cond:
+                worker.current = None
+            worker.completed += 1
+            if status == "ok":
+                request.future.set_result(result)
+            elif status == "cancelled":
+                request.future.set_exception(CancelledError())
+            else:
+                request.future.set_exception(RuntimeError(result))
+
+    def _failPending(self, error: Exception):
+        with self._cond:
+            if any(w.alive for w in self._workers):
+                return
+            for queue in self._queues.values():
+                for request in queue:
+                    if request.future.running() or request.future.set_running_or_notify_cancel():
+                        request.future.set_exception(error)
+            self._queues.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "queue_depth": self.queue_depth,
+            "conversations_waiting": len(self._queues),
+            "workers": [
+                {
+                    "index": worker.index,
+                    "alive": worker.alive,
+                    "busy": worker.current is not None,
+                    "completed": worker.completed,
+                    "utilisation": worker.busy_seconds / elapsed,
+                }
+                for worker in self._workers
+            ],
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
@@ -0,0 +1,156 @@
+"""
+Process-wide registry of GPT4All models.
+getModel() returns a lightweight stand-in that loads the real model the first time it is used,
+and every caller asking for the same model file and device shares one loaded instance. Models can
+be preloaded on a background thread (e.g. while a CLI prints its banner or waits for input) and
+unloaded again after sitting idle. Each loaded instance also has one PromptSession, shared by
+every caller that reuses prompts on it (getPromptSession), and replaced when the model is reloaded.
+"""
+import threading
+import time
+import weakref
+
+from PromptSession import PromptSession
+
+DEFAULT_MODEL = "Meta-Llama-3-8B-Instruct.Q4_0.gguf"
+
+
+class _Entry:
+    __slots__ = ("model", "session", "last_used", "lock", "loaded_at")
+
+    def __init__(self):
+        self.model = None
+        self.session = None
+        self.last_used = 0.0
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries = {}  # (model name, device) -> _Entry
+        self._lock = threading.Lock()
+        self._sessions = weakref.WeakKeyDictionary()  # models not loaded through the registry -> PromptSession
+        self._reaper = None
+
+    def _entry(self, name: str, device: str) -> _Entry:
+        with self._lock:
+            return self._entries.setdefault((name, device), _Entry())
+
+    def load(self, name: str = DEFAULT_MODEL, device: str = "gpu"):
+        """Returns the loaded GPT4All instance, loading it if nobody has yet."""
+        entry = self._entry(name, device)
+        entry.last_used = time.monotonic()
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    from gpt4all import GPT4All  # the import alone takes a noticeable moment
+                    entry.model = GPT4All(name, device=device)
+                    entry.loaded_at = time.monotonic()
+        return entry.model
+
+    def session(self, name: str = DEFAULT_MODEL, device: str = "gpu") -> PromptSession:
+        """The PromptSession of the loaded instance; a model loaded again after unloadIdle gets a new one."""
+        entry = self._entry(name, device)
+        model = self.load(name, device)
+        with entry.lock:
+            if entry.session is None or entry.session.model is not model:
+                entry.session = PromptSession(model)
+            return entry.session
+
+    def sessionFor(self, model) -> PromptSession:
+        """The PromptSession for a LazyModel from this registry, or for any other model instance."""
+        if isinstance(model, LazyModel):
+            return self.session(model._name, model._device)
+        with self._lock:
+            session = self._sessions.get(model)
+            if session is None:
+                session = self._sessions[model] = PromptSession(model)
+            return session
+
+    def get(self, name: str = DEFAULT_MODEL, device: str = "gpu") -> "LazyModel":
+        return LazyModel(self, name, device)
+
+    def preload(self, name: str = DEFAULT_MODEL, device: str = "gpu") -> threading.Thread:
+        """Starts loading the model on a background thread; the first real use waits for it if needed."""
+        thread = threading.Thread(target=self.load, args=(name, device), daemon=True, name=f"preload-{name}")
+        thread.start()
+        return thread
+
+    def isLoaded(self, name: str = DEFAULT_MODEL, device: str = "gpu") -> bool:
+        entry = self._entries.get((name, device))
+        return entry is not None and entry.model is not None
+
+    def unloadIdle(self, max_idle: float) -> list:
+        """Frees models that haven't been used for max_idle seconds. Returns the (name, device) keys unloaded."""
+        now = time.monotonic()
+        unloaded = []
+        with self._lock:
+            entries = list(self._entries.items())
+        for key, entry in entries:
+            if entry.model is None or now - entry.last_used < max_idle:
+                continue
+            # a generation still running on the session counts as use
+            if entry.session is not None and entry.session.busy:
+                continue
+            # skip it if someone is loading it right now
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                model, entry.model = entry.model, None
+                entry.session = None  # its tracked prefix belongs to the closed instance
+                if model is not None:
+                    model.close()
+                    unloaded.append(key)
+            finally:
+                entry.lock.release()
+        return unloaded
+
+    def startIdleReaper(self, max_idle: float = 600.0, interval: float = 60.0):
+        """Calls unloadIdle(max_idle) every interval seconds on a daemon thread."""
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.unloadIdle(max_idle)
+
+        self._reaper = threading.Thread(target=reap, daemon=True, name="model-reaper")
+        self._reaper.start()
+
+
+class LazyModel:
+    """
+    Stands in for a GPT4All instance. Attribute access goes to the shared model in the registry,
+    loading it on first use (and again if it was unloaded while idle).
+    """
+
+    def __init__(self, registry: ModelRegistry, name: str, device: str):
+        self._registry = registry
+        self._name = name
+        self._device = device
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.load(self._name, self._device), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._registry.isLoaded(self._name, self._device) else "not loaded"
+        return f"LazyModel({self._name!r}, device={self._device!r}, {state})"
+
+
+registry = ModelRegistry()
+
+
+def getModel(name: str = DEFAULT_MODEL, device: str = "gpu") -> LazyModel:
+    """The shared, lazily loaded model for name/device."""
+    return registry.get(name, device)
+
+
+def getPromptSession(model) -> PromptSession:
+    """The one PromptSession for model (a getModel() stand-in or a model instance)."""
+    return registry.sessionFor(model)
+
+
+def preloadModel(name: str = DEFAULT_MODEL, device: str = "gpu") -> threading.Thread:
+    return registry.preload(name, device)
@@ -0,0 +1,118 @@
+"""
+Prompt-prefix reuse for GPT4All models.
+A PromptSession keeps one chat session open on the model and remembers the exact text the model
+has already processed (previous prompts plus the tokens it generated). When the next prompt
+starts with that text, only the new suffix is fed to the model, so the KV-cache built for the
+shared prefix is reused instead of re-processing the whole history every turn.
+There is one session per model instance (ModelRegistry.getPromptSession), since a model only has
+one context. If anything else opens a chat session on the model or generates in this one, the
+tracked text no longer matches the context and the session starts over on the next prompt.
+"""
+import threading
+from contextlib import contextmanager
+
+DEFAULT_MAX_PREFIX_CHARS = 6000  # roughly a 2048-token context; reset before the model starts shifting it
+
+
+class PromptSession:
+    def __init__(self, model, max_prefix_chars: int = DEFAULT_MAX_PREFIX_CHARS):
+        """
+        model: a loaded GPT4All instance
+        max_prefix_chars: reset once the processed text grows past this, before the context overflows
+        """
+        self.model = model
+        self.max_prefix_chars = max_prefix_chars
+        self.reused_chars = 0
+        self.processed_chars = 0
+        self.resets = 0
+        self._session = None
+        self._conversation = None  # only one conversation can own the model's KV-cache at a time
+        self._prefix = None
+        self._history = None  # the model's chat history list while our session is open, and its length
+        self._history_len = 0
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def _owned(self) -> bool:
+        """Whether the model's chat history is still the one our session opened, with nothing added since."""
+        history = getattr(self.model, "_history", None)
+        return history is self._history and (history is None or len(history) == self._history_len)
+
+    def _track(self):
+        history = getattr(self.model, "_history", None)
+        self._history = history
+        self._history_len = len(history) if history is not None else 0
+
+    def reset(self):
+        """Closes the chat session; the next generate() starts from an empty context."""
+        # if someone else replaced our chat session, closing ours would end theirs
+        if self._session is not None and self._owned():
+            self._session.__exit__(None, None, None)
+        self._session = None
+        self._conversation = None
+        self._prefix = None
+        self._history = None
+        self._history_len = 0
+
+    def _open(self, conversation_id):
+        self.reset()
+        # "{0}" keeps prompts verbatim, so the model's context is exactly the text we track
+        self._session = self.model.chat_session(system_prompt="", prompt_template="{0}")
+        self._session.__enter__()
+        self._track()
+        self._conversation = conversation_id
+        self._prefix = ""
+        self.resets += 1
+
+    def generate(self, prompt: str, conversation_id="default", callback=None, **kwargs) -> str:
+        """
+        Same as GPT4All.generate, but only the part of prompt the model hasn't seen yet is processed.
+        The session is reset when the prompt diverges from the loaded prefix, when another
+        conversation or chat session used the model last, or when the context is close to full.
+        """
+        with self._lock:
+            if (self._prefix is None or not self._owned() or self._conversation != conversation_id
+                    or not prompt.startswith(self._prefix) or len(prompt) > self.max_prefix_chars):
+                self._open(conversation_id)
+            new_text = prompt[len(self._prefix):]
+            self.reused_chars += len(self._prefix)
+            self.processed_chars += len(new_text)
+
+            generated = []
+
+            def _callback(token_id, token):
+                generated.append(token)
+                return callback(token_id, token) if callback else True
+
+            try:
+                response = self.model.generate(new_text, callback=_callback, **kwargs)
+            except Exception:
+                self.reset()
+                raise
+            # the model's context now holds the prompt plus every token it produced, including
+            # any stop sequence the caller cut off
+            self._prefix = prompt + "".join(generated)
+            self._track()
+            return response
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Lends the model to a caller that runs its own chat_session() or one-off generate(); our
+        session is closed first and started over afterwards, and other users wait meanwhile.
+        """
+        with self._lock:
+            self.reset()
+            yield self.model
+
+    def stats(self) -> dict:
+        total = self.reused_chars + self.processed_chars
+        return {
+            "resets": self.resets,
+            "reused_chars": self.reused_chars,
+            "processed_chars": self.processed_chars,
+            "reuse_ratio": self.reused_chars / total if total else 0.0,
+        }
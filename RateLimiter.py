@@ -0,0 +1,184 @@
+"""
+Client-side protection for the Amadeus quota.
+TokenBucket spaces requests out to the API tier's rate, shared by every client in the process
+so that parallel tool calls queue briefly instead of getting 429s. RetryPolicy decides how long
+to wait before retrying a 429, a 5xx or a dropped connection: exponential backoff with full
+jitter, or the server's Retry-After when it sends one. CircuitBreaker stops calling the API
+for a while after repeated failures, so callers can serve cached or degraded results at once
+instead of waiting on an API that is down.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+
+import requests
+
+# requests per second for the API tier (the Amadeus test tier allows 10); 0 turns the limit off
+RATE_LIMIT = float(os.getenv("AMADEUS_RATE_LIMIT", "10"))
+RATE_BURST = int(os.getenv("AMADEUS_RATE_BURST", "0")) or None  # default: one second's worth
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised instead of calling an API that has been failing; retry after `retry_in` seconds."""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = None):
+        """
+        rate: requests per second allowed on average, 0 for no limit
+        burst: requests that may go out back to back after a quiet spell (default: rate)
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, round(rate))
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token, returning how long the caller has to wait until it is theirs."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # tokens can go negative: later callers queue up behind the ones already waiting
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait:
+                self.waits += 1
+                self.waited_seconds += wait
+            return wait
+
+    def acquire(self):
+        """Blocks until a request may go out."""
+        if self.rate <= 0:
+            return
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "burst": self.capacity, "waits": self.waits, "waited_s": round(self.waited_seconds, 3)}
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0, max_retry_after: float = 30.0):
+        """
+        max_retries: retries after the first attempt
+        base_delay, max_delay: backoff bounds in seconds; attempt n waits up to base_delay * 2**n
+        max_retry_after: longest Retry-After we are willing to wait; longer ones give up at once
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @staticmethod
+    def retryAfter(response) -> float:
+        """Seconds asked for by a Retry-After header (delay or HTTP date), or None."""
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt: int, response=None) -> float:
+        """
+        Seconds to wait before retry number attempt (0-based), or None to give up.
+        Retry-After is honoured, with a little jitter so waiting callers don't all return together.
+        """
+        if attempt >= self.max_retries:
+            return None
+        retry_after = self.retryAfter(response)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        failure_threshold: failures in a row that open the circuit
+        reset_timeout: seconds the circuit stays open before one trial request is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        """Call before a request; raises CircuitOpen while the API is considered down."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True  # this request is the trial
+                return
+            self.rejected += 1
+            raise CircuitOpen(f"API unavailable after {self.failures} failures, retrying in {max(0.0, retry_in):.0f}s",
+                              max(0.0, retry_in))
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        """Ends a trial request that neither succeeded nor failed (it never reached the API)."""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def getRateLimiter() -> TokenBucket:
+    """The process-wide bucket for the Amadeus API, set by AMADEUS_RATE_LIMIT and AMADEUS_RATE_BURST."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+    return _limiter
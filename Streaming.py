@@ -0,0 +1,86 @@
+"""
+Helpers for printing model output token by token.
+TurnStats measures time-to-first-token and throughput for one turn; StopSequenceMatcher
+holds back text that might be the start of a stop sequence so it never reaches the screen.
+estimateTokens gives a quick token count for budgeting prompts and tool output.
+"""
+import time
+
+
+def estimateTokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English with Llama-style tokenizers)."""
+    return len(text) // 4 + 1
+
+
+class TurnStats:
+    """Timing for one streamed turn."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+        self.tokens = 0
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token is None or self.tokens < 2:
+            return None
+        end = self.end or time.perf_counter()
+        return (self.tokens - 1) / max(end - self.first_token, 1e-9)
+
+    def report(self) -> str:
+        if self.first_token is None:
+            return "[no tokens]"
+        tps = self.tokens_per_second
+        rate = f", {tps:.1f} tokens/s" if tps is not None else ""
+        return f"[{self.tokens} tokens, first token after {self.time_to_first_token:.2f}s{rate}]"
+
+
+class StopSequenceMatcher:
+    """
+    Incremental stop-sequence detection over a token stream.
+    feed() returns the text that is safe to emit; anything that could still turn out to be the
+    beginning of a stop sequence is held back until the next token decides it, so a stop
+    sequence split across several tokens is still caught.
+    """
+
+    def __init__(self, stops):
+        self.stops = [stop for stop in (stops or []) if stop]
+        self.stopped = False
+        self._buffer = ""
+
+    def feed(self, token: str) -> str:
+        if self.stopped:
+            return ""
+        self._buffer += token
+        hits = [i for i in (self._buffer.find(stop) for stop in self.stops) if i != -1]
+        if hits:
+            self.stopped = True
+            out, self._buffer = self._buffer[:min(hits)], ""
+            return out
+        keep = 0
+        for stop in self.stops:
+            for k in range(min(len(stop) - 1, len(self._buffer)), keep, -1):
+                if self._buffer.endswith(stop[:k]):
+                    keep = k
+                    break
+        out = self._buffer[:len(self._buffer) - keep]
+        self._buffer = self._buffer[len(self._buffer) - keep:]
+        return out
+
+    def flush(self) -> str:
+        """Releases whatever is still held back once generation has ended without a stop."""
+        out, self._buffer = self._buffer, ""
+        return out
@@ -1,40 +1,11 @@
 from langchain.agents import Tool
-from gpt4all import GPT4All
 from langchain.agents import initialize_agent
-from langchain.llms.base import LLM
-from pydantic import PrivateAttr
-from langchain.schema import Generation, LLMResult
 import re
 
-class GPT4AllLangChain(LLM):
-    _model: GPT4All = PrivateAttr()
+from GPT4AllLangChain import GPT4AllLangChain
+from IntentRouter import NUMBER, IntentRouter, RoutedAgent
+from LLMCache import getCache
 
-    def __init__(self, model_path, device="gpu", **kwargs):
-        super().__init__(**kwargs)
-        self._model = GPT4All(model_path, device=device)
-
-    @property
-    def _llm_type(self):
-        return "gpt4all"
-
-    def _call(self, prompt: str, stop=None):
-        with self._model.chat_session():
-            response = self._model.generate(prompt, max_tokens=200)  # Shorter responses
-            
-            if stop:
-                for stop_seq in stop:
-                    if stop_seq in response:
-                        response = response.split(stop_seq)[0]
-                        break
-            
-            return response
-    
-    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop=stop)
-            generations.append([Generation(text=text)])
-        return LLMResult(generations=generations)
 
 def GetSumPlus1(inp: str) -> str:
     print(f"[DEBUG] Tool received input: '{inp}'")
@@ -74,7 +45,9 @@ multiply = Tool(
     func=Multiply
 )
 
-wrapped_model = GPT4AllLangChain("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu")
+# sampled cool enough for LLMCache to keep the answers, so repeated questions skip the model
+wrapped_model = GPT4AllLangChain("Meta-Llama-3-8B-Instruct.Q4_0.gguf", device="gpu", temp=0.3,
+                                 cache=getCache().asLangChainCache())
 agent = initialize_agent(
     [sumPlus1, multiply], 
     wrapped_model, 
@@ -86,10 +59,24 @@ agent = initialize_agent(
     }
 )
 
-print("=== TESTING ===")
-result = agent.run("what is 5615 multiplied by 576")
-print(f"\n=== FINAL RESULT: {result} ===")
+# plain arithmetic questions are answered by the tools without the agent
+router = IntentRouter()
+router.add("multiply", rf"(?:what(?:'s|\s+is)\s+)?(?:(?P<numbers>{NUMBER}\s*(?:multiplied\s+by|times|\*|x)\s*{NUMBER})"
+           rf"|the\s+product\s+of\s+(?P<pair>{NUMBER}\s*(?:and|,)\s*{NUMBER}))\s*[?.!=]*",
+           lambda match: Multiply(match["numbers"] or match["pair"]))
+router.add("sum_plus_1", rf"(?:what(?:'s|\s+is)\s+)?(?:the\s+)?sum\s+of\s+(?P<numbers>{NUMBER}(?:\s*(?:,|and|\+)\s*{NUMBER})+)\s+plus\s+(?:1|one)\s*[?.!=]*",
+           lambda match: GetSumPlus1(match["numbers"]))
+agent = RoutedAgent(agent, router)
+
+def main():
+    print("=== TESTING ===")
+    result = agent.run("what is 5615 multiplied by 576")
+    print(f"\n=== FINAL RESULT: {result} ===")
+
+    print("\n=== DIRECT TOOL TEST ===")
+    direct_result = GetSumPlus1("11.521, 2")
+    print(f"Direct tool result: {direct_result}")
+    print(router.report())
 
-print("\n=== DIRECT TOOL TEST ===")
-direct_result = GetSumPlus1("11.521, 2")
-print(f"Direct tool result: {direct_result}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
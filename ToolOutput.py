@@ -0,0 +1,92 @@
+"""
+Shaping of tool results before they go back into the prompt.
+Hotel listings are ranked (nearest first, with a good rating worth a little distance) and cut to
+one compact line per hotel, a page at a time: the model sees the best few and a note saying how
+many more it can page through. Any tool result can also be held to a token budget.
+"""
+from Streaming import estimateTokens
+
+DEFAULT_PAGE_SIZE = 10
+DEFAULT_TOKEN_BUDGET = 600
+
+# a hotel rated 100 ranks level with an unrated one this many km closer
+RATING_WEIGHT_KM = 0.5
+
+
+def rankHotels(hotels: list, ratings: dict = None) -> list:
+    """
+    Hotels ordered by distance, nudged by overall rating when ratings ({hotel ID: Rating}) are given.
+    Hotels without a distance go last.
+    """
+    ratings = ratings or {}
+
+    def score(hotel):
+        if hotel.distance is None:
+            return float("inf")
+        rating = ratings.get(hotel.hotelId)
+        if rating is not None and rating.available and isinstance(rating.overallRating, (int, float)):
+            return hotel.distance - RATING_WEIGHT_KM * rating.overallRating / 100
+        return hotel.distance
+
+    return sorted(hotels, key=score)
+
+
+def ratingCandidates(hotels: list, offset: int = 0, page_size: int = DEFAULT_PAGE_SIZE) -> list:
+    """
+    IDs of the hotels whose ratings decide pages up to offset + page_size: the nearest that many,
+    plus any hotel close enough behind them for a rating to pull it forward. The rest can't get there.
+    """
+    by_distance = sorted((hotel for hotel in hotels if hotel.distance is not None), key=lambda hotel: hotel.distance)
+    wanted = max(0, int(offset)) + page_size
+    if len(by_distance) <= wanted:
+        return [hotel.hotelId for hotel in by_distance]
+    reach = by_distance[wanted - 1].distance + RATING_WEIGHT_KM
+    # every ID is a rating request, so a dense city centre is held to twice the page
+    return [hotel.hotelId for hotel in by_distance[:2 * wanted] if hotel.distance <= reach]
+
+
+def compactHotel(hotel, rating=None) -> str:
+    parts = [f"ID:{hotel.hotelId}", hotel.name]
+    if hotel.distance is not None:
+        parts.append(f"{hotel.distance:g} km")
+    if rating is not None and rating.available:
+        parts.append(f"rated {rating.overallRating}/100")
+    return " | ".join(parts)
+
+
+def shapeHotels(hotels: list, offset: int = 0, page_size: int = DEFAULT_PAGE_SIZE, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                ratings: dict = None, more_hint: str = "call again with offset={offset}") -> str:
+    """
+    The ranked hotels from offset on, a line each, at most page_size of them and within token_budget.
+    Ends with how many hotels are left and more_hint (formatted with the offset to continue from).
+    """
+    if not hotels:
+        return "No hotels found."
+    ranked = rankHotels(hotels, ratings)
+    ratings = ratings or {}
+    offset = max(0, int(offset))
+    if offset >= len(ranked):
+        return f"No more hotels: there are {len(ranked)} in total."
+    lines = []
+    used = 0
+    for hotel in ranked[offset:offset + page_size]:
+        line = compactHotel(hotel, ratings.get(hotel.hotelId))
+        used += estimateTokens(line)
+        if lines and used > token_budget:
+            break
+        lines.append(line)
+    remaining = len(ranked) - offset - len(lines)
+    if remaining > 0:
+        lines.append(f"({remaining} more available - {more_hint.format(offset=offset + len(lines))})")
+    return "\n".join(lines)
+
+
+def fitBudget(text: str, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """text cut to about token_budget tokens, saying how much was left out."""
+    if estimateTokens(text) <= token_budget:
+        return text
+    keep = token_budget * 4
+    cut = text.rfind("\n", 0, keep)
+    if cut < keep // 2:
+        cut = keep
+    return text[:cut] + f"\n... ({len(text) - cut} more characters not shown)"
@@ -0,0 +1,275 @@
+"""
+Spans and metrics for finding where a turn's time goes.
+Graph nodes, tool calls, Amadeus HTTP requests and LLM generations open spans on the shared
+tracer. Tracing is off unless TRACE_SAMPLE_RATE is set (0 to 1, the share of turns traced),
+and while it is off a span is one attribute check returning a shared no-op object.
+
+Finished spans feed duration histograms and token counters that metrics() renders in Prometheus
+text format (written to TRACE_METRICS_PATH on close(), if set), and with TRACE_PATH set every span is appended to a JSONL file of Chrome trace
+events. Convert that file for chrome://tracing, Perfetto or speedscope with:
+
+    python Tracing.py trace.jsonl trace.json
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_PATH = os.getenv("TRACE_PATH")
+TRACE_METRICS_PATH = os.getenv("TRACE_METRICS_PATH")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "travelbot"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_PID = os.getpid()
+
+
+class _NoopSpan:
+    """Returned when tracing is off or the turn isn't sampled; does nothing."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    """Marks a turn that wasn't sampled, so the spans inside it are skipped too."""
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "attrs", "trace_id", "start", "end", "thread", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, attrs: dict, trace_id: int):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.trace_id = trace_id
+        self.start = self.end = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, path: str = None, metrics_path: str = None):
+        """
+        sample_rate: share of root spans (turns) traced, 0 turns tracing off
+        path: optional JSONL file every finished span is appended to as a Chrome trace event
+        metrics_path: optional file close() writes metrics() to
+        """
+        self.sample_rate = sample_rate
+        self.enabled = sample_rate > 0
+        self.path = path
+        self.metrics_path = metrics_path
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, category) -> _Histogram
+        self._counters = {}  # (metric, labels) -> value
+        self._gauges = {}
+        self._file = None
+        self._epoch = time.perf_counter()
+
+    def configure(self, sample_rate: float = None, path: str = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+            self.enabled = sample_rate > 0
+        if path is not None:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self.path = path
+
+    def span(self, name: str, category: str = "app", **attrs):
+        """Context manager timing a block; spans opened inside it become its children."""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current.get()
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return _UnsampledSpan()
+            return Span(self, name, category, attrs, random.getrandbits(48))
+        if isinstance(parent, _UnsampledSpan):
+            return NOOP_SPAN
+        return Span(self, name, category, attrs, parent.trace_id)
+
+    def traced(self, name: str, category: str = "node"):
+        """Decorator putting every call of a (sync or async) function in a span."""
+        def decorate(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def tracedAsync(*args, **kwargs):
+                    with self.span(name, category):
+                        return await func(*args, **kwargs)
+                return tracedAsync
+
+            @functools.wraps(func)
+            def tracedSync(*args, **kwargs):
+                with self.span(name, category):
+                    return func(*args, **kwargs)
+            return tracedSync
+        return decorate
+
+    def llmTokens(self, source: str, tokens: int, seconds: float):
+        """Counts tokens generated by an LLM (source: gpt4all, openai, ...) and the time it took."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for metric, value in (("llm_tokens_total", tokens), ("llm_generation_seconds_total", seconds)):
+                key = (metric, (("source", source),))
+                self._counters[key] = self._counters.get(key, 0) + value
+            if seconds > 0:
+                self._gauges[("llm_tokens_per_second", (("source", source),))] = tokens / seconds
+        span = _current.get()
+        if isinstance(span, Span):
+            span.set(tokens=tokens, tokens_per_second=round(tokens / seconds, 1) if seconds > 0 else None)
+
+    def count(self, metric: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _finish(self, span: Span):
+        with self._lock:
+            histogram = self._histograms.get((span.name, span.category))
+            if histogram is None:
+                histogram = self._histograms[(span.name, span.category)] = _Histogram()
+            histogram.observe(span.duration)
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1)
+                event = {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round((span.start - self._epoch) * 1e6, 1),
+                    "dur": round(span.duration * 1e6, 1),
+                    "pid": _PID,
+                    "tid": span.thread,
+                    "args": dict(span.attrs, trace_id=span.trace_id),
+                }
+                self._file.write(json.dumps(event, default=str) + "\n")
+
+    def metrics(self) -> str:
+        """Everything measured so far in Prometheus text exposition format."""
+        lines = [f"# TYPE {METRIC_PREFIX}_span_seconds histogram"]
+        with self._lock:
+            for (name, category), histogram in sorted(self._histograms.items()):
+                labels = f'name="{name}",category="{category}"'
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{METRIC_PREFIX}_span_seconds_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"{METRIC_PREFIX}_span_seconds_count{{{labels}}} {histogram.count}")
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (metric, labels), value in sorted(values.items()):
+                    if metric not in typed:
+                        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {kind}")
+                        typed.add(metric)
+                    label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                    lines.append(f"{METRIC_PREFIX}_{metric}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Short per-span table: calls, total and mean time, slowest first."""
+        with self._lock:
+            rows = sorted(self._histograms.items(), key=lambda item: -item[1].total)
+        lines = [f"{'span':56} {'calls':>6} {'total':>9} {'mean':>9}"]
+        for (name, category), histogram in rows:
+            lines.append(f"{category + ':' + name:56} {histogram.count:6} {histogram.total:8.3f}s "
+                         f"{1000 * histogram.total / histogram.count:7.1f}ms")
+        return "\n".join(lines)
+
+    def close(self):
+        """Flushes the trace file and writes the metrics file, if there are any."""
+        if self.enabled and self.metrics_path:
+            with open(self.metrics_path, "w") as f:
+                f.write(self.metrics())
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, TRACE_PATH, TRACE_METRICS_PATH)
+
+
+def toChromeTrace(jsonl_path: str, json_path: str):
+    """Turns a TRACE_PATH file into the JSON array chrome://tracing, Perfetto and speedscope open."""
+    with open(jsonl_path) as source:
+        events = [json.loads(line) for line in source if line.strip()]
+    with open(json_path, "w") as target:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, target)
+    return len(events)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python Tracing.py trace.jsonl trace.json")
+    print(f"{toChromeTrace(sys.argv[1], sys.argv[2])} events written to {sys.argv[2]}")
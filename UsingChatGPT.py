@@ -1,3 +1,6 @@
+import argparse
+import asyncio
+import time
 from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
@@ -8,70 +11,69 @@ from langchain.chat_models import init_chat_model
 import json
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
 from langchain.tools import tool
 
-from AmadeusCall import searchHotels
-class BasicToolNode:
-    """A node that runs the tools requested in the last AIMessage."""
+from AmadeusCall import getAsyncClient, getRatings, searchHotels
+from BasicToolNode import BasicToolNode
+from HotelCatalog import getCatalog
+from HotelSearch import searchDescriptions
+from IntentRouter import IntentRouter, hotelRoutes
+from LLMCache import getCache
+from Streaming import TurnStats
+from ToolOutput import DEFAULT_TOKEN_BUDGET, ratingCandidates, shapeHotels
+from Tracing import tracer
 
-    def __init__(self, tools: list) -> None:
-        self.tools_by_name = {tool.name: tool for tool in tools}
-
-    def __call__(self, inputs: dict):
-        if messages := inputs.get("messages", []):
-            message = messages[-1]
-        else:
-            raise ValueError("No message found in input")
-        outputs = []
-        for tool_call in message.tool_calls:
-            tool_result = self.tools_by_name[tool_call["name"]].invoke(
-                tool_call["args"]
-            )
-            outputs.append(
-                ToolMessage(
-                    content=json.dumps(tool_result),
-                    name=tool_call["name"],
-                    tool_call_id=tool_call["id"],
-                )
-            )
-        return {"messages": outputs}
-
-
-hotels = {
-    "Paris": ["Hotel A", "Hotel B", "Hotel C"],
-    "New York": ["Hotel D", "Hotel E", "Hotel F"],
-    "Tokyo": ["Hotel G", "Hotel H", "Hotel I"]
-}
-hotel_descriptions = {
-    "Hotel A": "A budget-friendly hotel with basic amenities.",
-    "Hotel B": "A mid-range hotel with comfortable rooms and free breakfast.",
-    "Hotel C": "A luxury hotel with a spa and fine dining.",
-    "Hotel D": "A budget hotel located in the heart of the city.",
-    "Hotel E": "A boutique hotel with unique decor and personalized service.",
-    "Hotel F": "A family-friendly hotel with a pool and play area.",
-    "Hotel G": "A modern hotel with stunning views of the city skyline.",
-    "Hotel H": "An eco-friendly hotel with sustainable practices.",
-    "Hotel I": "A traditional hotel with a rich history."
-}
 # @tool
 # def findHotelsByCity(city: str) -> str:
 #     """Returns a list of hotels
 #     Args:
 #         city (str): The name of the city to find hotels in.
 #     """
-#     city = city.strip("'\" ")
-#     if city in hotels:
-#         return ", ".join(hotels[city])
+#     found = getCatalog().hotelsIn(city.strip("'\" "))  # from HotelCatalog import getCatalog
+#     if found:
+#         return ", ".join(found)
 #     return "No hotels found."
 @tool
-def FindHotelsByCoords(coords: list, radius: int) -> str:
-    """Returns a list of hotels - ID is used for future functions using the hotel, not to be returned to user. 
+def FindHotelsByCoords(coords: list, radius: int, offset: int = 0) -> str:
+    """Returns the nearest hotels, a page at a time - ID is used for future functions using the hotel, not to be returned to user. 
     Args:
         coords (list): The Coordinates of the location, in the format [latitude, longitude].
         radius (int): The radius (in km) to search for hotels.
+        offset (int): How many hotels to skip, to see more than the first page.
     """
     latitude, longitude = coords
-    return searchHotels(latitude, longitude, radius)
+    hotels = searchHotels(latitude, longitude, radius)
+    # ratings come back unavailable while the API is down, and the hotels are then ranked by distance alone
+    ratings = getRatings(ratingCandidates(hotels, offset))
+    return shapeHotels(hotels, offset=offset, ratings=ratings,
+                       more_hint="call FindHotelsByCoords again with offset={offset}")
+
+def _findHotelsNearLocations(coords_list: list, radius: int) -> str:
+    return asyncio.run(_afindHotelsNearLocations(coords_list, radius))
+
+async def _afindHotelsNearLocations(coords_list: list, radius: int) -> str:
+    client = getAsyncClient()
+    results = await client.search_many([tuple(coords) for coords in coords_list], radius)
+    ratings = await asyncio.gather(*(client.get_ratings(ratingCandidates(result, page_size=5)) for result in results))
+    # the budget is shared between the locations
+    budget = DEFAULT_TOKEN_BUDGET // max(1, len(coords_list))
+    return "\n".join(
+        f"Near {coords}:\n" + shapeHotels(result, page_size=5, token_budget=budget, ratings=rated,
+                                         more_hint=f"call FindHotelsByCoords for {list(coords)}, radius {radius} with offset={{offset}}")
+        for coords, result, rated in zip(coords_list, results, ratings))
+
+FindHotelsNearLocations = StructuredTool.from_function(
+    func=_findHotelsNearLocations,
+    coroutine=_afindHotelsNearLocations,
+    name="FindHotelsNearLocations",
+    description="""Returns a list of hotels around each of several locations at once - use instead of calling FindHotelsByCoords repeatedly.
+    Args:
+        coords_list (list): The coordinates of every location, each in the format [latitude, longitude].
+        radius (int): The radius (in km) to search for hotels around each location.
+    """,
+)
 
 @tool
 def DescribeHotel(hotel_ID: str) -> str:
@@ -80,29 +82,33 @@ def DescribeHotel(hotel_ID: str) -> str:
         hotel_ID (str): The ID of the hotel to describe.
     """
     #  had this working on local data - but trying to figure out how to transfer hotelID to amadeus hotelID for the API. 
-    return "Hotel description not available."
+    # Amadeus IDs loaded into the catalog (HotelCatalog.py load ...) are described from there
+    return getCatalog().describe(hotel_ID) or "Hotel description not available."
+
+@tool
+def DescribeHotels(hotel_IDs: list[str]) -> dict:
+    """Returns the descriptions of several hotels at once - use instead of calling DescribeHotel repeatedly.
+    Args:
+        hotel_IDs (list[str]): The IDs of the hotels to describe.
+    """
+    return {hotel_ID: description or "Hotel description not available."
+            for hotel_ID, description in getCatalog().describeMany(hotel_IDs).items()}
+
+@tool
+def SearchHotelDescriptions(query: str, city: str = None, k: int = 5) -> str:
+    """Returns the k hotels whose descriptions best match what the user is looking for, with their descriptions - one call instead of describing hotels one by one.
+    Args:
+        query (str): What the user is looking for, e.g. "eco-friendly places near the skyline".
+        city (str): Optional city to search in.
+        k (int): How many hotels to return.
+    """
+    return searchDescriptions(query, city=city, k=k)
 # tools = [findHotelsByCity, FindHotelsByCoords, DescribeHotel]
-tools = [FindHotelsByCoords, DescribeHotel]
+tools = [FindHotelsByCoords, FindHotelsNearLocations, DescribeHotel, DescribeHotels, SearchHotelDescriptions]
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
 
-load_dotenv()
-graph_builder = StateGraph(State)
-
-llm = ChatOpenAI(
-    model="gpt-5-nano",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
-llm_with_tools = llm.bind_tools(tools)
-
-def chatbot(state: State):
-    response = llm_with_tools.invoke(state["messages"])
-    return {"messages": [response]}
-
 def route_tools(
     state: State,
 ):
@@ -121,19 +127,68 @@ def route_tools(
     return END
 
 
-tool_node = BasicToolNode(tools)
-graph_builder.add_node("chatbot", chatbot)
-graph_builder.add_node("tools", tool_node)
+def buildGraph(llm, tool_node: BasicToolNode, router: IntentRouter = None):
+    """The chat graph around any chat model with bind_tools (Benchmark.py passes a scripted one)."""
+    llm_with_tools = llm.bind_tools(tools)
+
+    def recordUsage(response, start: float):
+        # ChatOpenAI reports the token counts with every response
+        if usage := getattr(response, "usage_metadata", None):
+            tracer.llmTokens("openai", usage.get("output_tokens", 0), time.perf_counter() - start)
+
+    @tracer.traced("chatbot")
+    def chatbot(state: State):
+        start = time.perf_counter()
+        response = llm_with_tools.invoke(state["messages"])
+        recordUsage(response, start)
+        return {"messages": [response]}
+
+    @tracer.traced("chatbot")
+    async def achatbot(state: State):
+        start = time.perf_counter()
+        response = await llm_with_tools.ainvoke(state["messages"])
+        recordUsage(response, start)
+        return {"messages": [response]}
+
+    graph_builder = StateGraph(State)
+    if router is not None:
+        graph_builder.add_node("router", tracer.traced("router")(router.node))
+        graph_builder.add_node("chatbot", RunnableLambda(router.timed(chatbot), afunc=router.timed(achatbot)))
+        graph_builder.add_edge(START, "router")
+        graph_builder.add_conditional_edges("router", router.next, {"chatbot": "chatbot", END: END})
+    else:
+        graph_builder.add_node("chatbot", RunnableLambda(chatbot, afunc=achatbot))
+        graph_builder.add_edge(START, "chatbot")
+    graph_builder.add_node("tools", RunnableLambda(tracer.traced("tools")(tool_node.__call__),
+                                                   afunc=tracer.traced("tools")(tool_node.acall)))
+
+    # Add edges
+    graph_builder.add_conditional_edges(
+        "chatbot",
+        tracer.traced("route_tools", "edge")(route_tools),
+        {"tools": "tools", END: END},
+    )
+    graph_builder.add_edge("tools", "chatbot")
+    return graph_builder.compile()
+
+
+load_dotenv()
 
-# Add edges
-graph_builder.add_conditional_edges(
-    "chatbot",
-    route_tools,
-    {"tools": "tools", END: END},
+llm = ChatOpenAI(
+    model="gpt-5-nano",
+    temperature=0,
+    max_tokens=None,
+    timeout=None,
+    max_retries=2,
+    stream_usage=True,  # token counts for the metrics, also when the reply is streamed
+    cache=getCache().asLangChainCache(temperature=0),
 )
-graph_builder.add_edge("tools", "chatbot")
-graph_builder.add_edge(START, "chatbot")
-graph = graph_builder.compile()
+
+tool_node = BasicToolNode(tools, timeout=30, max_concurrency=8, token_budget=2 * DEFAULT_TOKEN_BUDGET)
+# "describe <hotel>" for hotels the catalog knows skips the OpenAI round trip. Only tools the
+# model has are routed: hotel lists come from FindHotelsByCoords, not the catalog's city lists
+router = IntentRouter(hotelRoutes(describe=lambda name: DescribeHotel.invoke({"hotel_ID": name})))
+graph = buildGraph(llm, tool_node, router)
 
 from IPython.display import Image, display
 
@@ -146,14 +201,58 @@ except Exception:
     pass
 
 def stream_graph_updates(user_input: str):
-    for event in graph.stream({"messages": [{"role": "user", "content": user_input}]}):
-        for value in event.values():
-            print("Assistant:", value["messages"][-1].content)
+    with tracer.span("turn", "turn"):
+        for event in graph.stream({"messages": [{"role": "user", "content": user_input}]}):
+            for value in event.values():
+                if value and value["messages"]:
+                    print("Assistant:", value["messages"][-1].content)
+
+async def astream_graph_updates(user_input: str):
+    with tracer.span("turn", "turn"):
+        async for event in graph.astream({"messages": [{"role": "user", "content": user_input}]}):
+            for value in event.values():
+                if value and value["messages"]:
+                    print("Assistant:", value["messages"][-1].content)
+
+async def astream_graph_tokens(user_input: str):
+    """Prints the reply token by token as ChatOpenAI produces it, with tool calls shown as progress events."""
+    stats = TurnStats()
+    print("Assistant: ", end="", flush=True)
+    with tracer.span("turn", "turn"):
+        async for chunk, metadata in graph.astream({"messages": [{"role": "user", "content": user_input}]}, stream_mode="messages"):
+            if isinstance(chunk, ToolMessage):
+                print(f"\n[{chunk.name} finished]", flush=True)
+                continue
+            if metadata.get("langgraph_node") not in ("chatbot", "router"):
+                continue
+            for tool_call_chunk in getattr(chunk, "tool_call_chunks", []):
+                if tool_call_chunk.get("name"):
+                    print(f"\n[calling {tool_call_chunk['name']}...]", flush=True)
+            if chunk.content:
+                stats.token()
+                print(chunk.content, end="", flush=True)
+    stats.finish()
+    print()
+    print(stats.report())
 
-while True:
-    user_input = input("User: ")
-    if user_input.lower() in ["quit", "exit", "q"]:
-        print("Goodbye!")
-        break
+async def main(stream_tokens: bool = True):
+    # one event loop for the whole session, so tool calls that timed out can finish in the background
+    while True:
+        user_input = await asyncio.to_thread(input, "User: ")
+        if user_input.lower() in ["quit", "exit", "q"]:
+            print(router.report())
+            if tracer.enabled:
+                print(tracer.summary())
+                tracer.close()
+            print("Goodbye!")
+            break
+
+        if stream_tokens:
+            await astream_graph_tokens(user_input)
+        else:
+            await astream_graph_updates(user_input)
 
-    stream_graph_updates(user_input)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-stream", action="store_true", help="print whole node updates instead of tokens")
+    asyncio.run(main(stream_tokens=not parser.parse_args().no_stream))
\ No newline at end of file